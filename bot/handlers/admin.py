@@ -1,91 +1,119 @@
+import asyncio
+import html
 import logging
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from functools import partial
 
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import select, func
 
 from database.db import get_db
+from database.models import (
+    User, MonitoredProduct, Product, PriceRecord,
+    AggregateCounter, COUNTER_USERS, COUNTER_PAYMENTS, COUNTER_REVENUE,
+)
 from config import config
+from bot.utils.cache import TTLCache
+from bot.utils.helpers import plan_badge
+from bot.utils.ratelimit import tg_limiter
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+BROADCAST_PROGRESS_INTERVAL = 2
+BROADCAST_WORKERS = 25
+BROADCAST_QUEUE_SIZE = 1000
+
+# Рассылка идёт фоном: ссылки на задачи держим, чтобы их не собрал GC
+_broadcast_tasks: set = set()
+
+# Статистика админки не обязана быть точной до секунды
+ADMIN_STATS_TTL = 30
+_admin_stats_cache = TTLCache(maxsize=1, ttl=ADMIN_STATS_TTL)
+
 
 def is_admin(user_id: int) -> bool:
     return user_id in config.bot.admin_ids
 
 
-@router.message(Command("admin"))
-async def cmd_admin(message: Message):
-    """Админ-панель"""
-    if not is_admin(message.from_user.id):
-        return
+async def _compute_admin_stats() -> dict:
+    """Глобальная статистика для админ-панели (кешируется на ADMIN_STATS_TTL сек)"""
+    cached = _admin_stats_cache.get("stats")
+    if cached is not None:
+        return cached
 
     db = await get_db()
-    total_users = await db.get_total_users()
 
-    # Считаем подписчиков по планам
-    from sqlalchemy import select, func
-    from database.models import User, MonitoredProduct, Payment
+    def _count_users(*where):
+        return select(func.count(User.id)).where(*where).scalar_subquery()
 
-    async with db.session_factory() as session:
-        # Пользователи по планам
-        result = await session.execute(
-            select(User.plan, func.count(User.id)).group_by(User.plan)
+    def _counter(name: str):
+        return (
+            select(AggregateCounter.value)
+            .where(AggregateCounter.name == name)
+            .scalar_subquery()
         )
-        plan_stats = {row[0]: row[1] for row in result.all()}
 
-        # Активные мониторы
-        result = await session.execute(
-            select(func.count(MonitoredProduct.id)).where(
-                MonitoredProduct.is_active == True
-            )
-        )
-        active_monitors = result.scalar() or 0
+    today_start = datetime.combine(datetime.utcnow().date(), time.min)
+
+    # Вся статистика — одним запросом; итоговые суммы берём из aggregate_counters
+    stats_query = select(
+        _counter(COUNTER_USERS).label("total_users"),
+        _count_users(
+            User.created_at >= today_start,
+            User.created_at < today_start + timedelta(days=1),
+        ).label("new_today"),
+        _count_users(User.plan == "FREE").label("free"),
+        _count_users(User.plan == "PRO").label("pro"),
+        _count_users(User.plan == "PREMIUM").label("premium"),
+        select(func.count(MonitoredProduct.id))
+        .where(MonitoredProduct.is_active == True)
+        .scalar_subquery().label("active_monitors"),
+        _counter(COUNTER_PAYMENTS).label("total_payments"),
+        _counter(COUNTER_REVENUE).label("total_revenue"),
+    )
 
-        # Оплаты
-        result = await session.execute(
-            select(func.count(Payment.id)).where(
-                Payment.status == "succeeded"
-            )
-        )
-        total_payments = result.scalar() or 0
+    async with db.session_factory() as session:
+        row = (await session.execute(stats_query)).one()
 
-        result = await session.execute(
-            select(func.sum(Payment.amount)).where(
-                Payment.status == "succeeded"
-            )
-        )
-        total_revenue = result.scalar() or 0
+    stats = dict(row._mapping)
+    stats["total_users"] = int(stats["total_users"] or 0)
+    stats["total_payments"] = int(stats["total_payments"] or 0)
+    stats["computed_at"] = datetime.utcnow()
+    _admin_stats_cache.set("stats", stats)
+    return stats
 
-        # Сегодняшние пользователи
-        today = datetime.utcnow().date()
-        result = await session.execute(
-            select(func.count(User.id)).where(
-                func.date(User.created_at) == today
-            )
-        )
-        new_today = result.scalar() or 0
+
+@router.message(Command("admin"))
+async def cmd_admin(message: Message):
+    """Админ-панель"""
+    if not is_admin(message.from_user.id):
+        return
+
+    stats = await _compute_admin_stats()
 
     text = f"""
 👑 <b>ADMIN PANEL — PriceGhost</b>
 
 📊 <b>Пользователи:</b>
-├ Всего: <b>{total_users}</b>
-├ Новых сегодня: <b>{new_today}</b>
-├ FREE: {plan_stats.get('FREE', 0)}
-├ PRO: {plan_stats.get('PRO', 0)}
-└ PREMIUM: {plan_stats.get('PREMIUM', 0)}
+├ Всего: <b>{stats['total_users']}</b>
+├ Новых сегодня: <b>{stats['new_today']}</b>
+├ FREE: {stats['free']}
+├ PRO: {stats['pro']}
+└ PREMIUM: {stats['premium']}
 
 📦 <b>Мониторинг:</b>
-└ Активных отслеживаний: <b>{active_monitors}</b>
+└ Активных отслеживаний: <b>{stats['active_monitors']}</b>
 
 💰 <b>Финансы:</b>
-├ Успешных оплат: <b>{total_payments}</b>
-└ Доход: <b>{total_revenue:,.0f}₽</b>
+├ Успешных оплат: <b>{stats['total_payments']}</b>
+└ Доход: <b>{stats['total_revenue']:,.0f}₽</b>
 
-🕐 Время: {datetime.utcnow().strftime('%d.%m.%Y %H:%M')} UTC
+🕐 Время: {stats['computed_at'].strftime('%d.%m.%Y %H:%M')} UTC
 """
     await message.answer(text, parse_mode="HTML")
 
@@ -97,62 +125,142 @@ async def cmd_broadcast(message: Message):
         return
 
     # Формат: /broadcast Текст сообщения
+    # или /broadcast ответом на готовое сообщение — оно будет скопировано как есть
     text = message.text.replace("/broadcast", "").strip()
+    staged = message.reply_to_message
 
-    if not text:
+    if not text and not staged:
         await message.answer(
-            "Использование: /broadcast <текст сообщения>\n\n"
+            "Использование: /broadcast <текст сообщения>\n"
+            "или ответьте командой /broadcast на сообщение для рассылки "
+            "(так сохраняется форматирование)\n\n"
             "Пример:\n/broadcast 🎉 Новая функция! Теперь бот умеет..."
         )
         return
 
     db = await get_db()
+    total = await db.get_total_users()
 
-    from sqlalchemy import select
-    from database.models import User
-
-    async with db.session_factory() as session:
-        result = await session.execute(select(User.telegram_id))
-        user_ids = [row[0] for row in result.all()]
-
-    sent = 0
-    failed = 0
     bot = message.bot
 
     status_msg = await message.answer(
-        f"📤 Рассылка: 0/{len(user_ids)}..."
+        f"📤 Рассылка: 0/{total}..."
     )
 
-    for uid in user_ids:
+    if staged:
+        # Telegram сам размножает готовое сообщение — без повторного парсинга HTML
+        deliver = partial(
+            bot.copy_message,
+            from_chat_id=staged.chat.id,
+            message_id=staged.message_id,
+        )
+    else:
+        # Текст админа экранируем один раз: кривой HTML не должен ронять каждую отправку
+        payload = f"📢 <b>Уведомление от PriceGhost</b>\n\n{html.escape(text, quote=False)}"
+        deliver = partial(
+            bot.send_message,
+            text=payload,
+            parse_mode=ParseMode.HTML,
+        )
+
+    # Рассылка может идти десятки минут — не держим хендлер (и очередь чата
+    # в ChatOrderMiddleware), чтобы админ мог пользоваться ботом параллельно
+    task = asyncio.create_task(_run_broadcast(db, deliver, status_msg, total))
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
+
+
+async def _run_broadcast(db, deliver, status_msg: Message, total: int):
+    """Отправка рассылки всем пользователям с обновлением статуса"""
+    progress = {"sent": 0, "failed": 0}
+
+    async def _send_one(uid: int) -> bool:
         try:
-            await bot.send_message(
-                chat_id=uid,
-                text=f"📢 <b>Уведомление от PriceGhost</b>\n\n{text}",
-                parse_mode="HTML",
-            )
-            sent += 1
+            await tg_limiter.send(uid, partial(deliver, chat_id=uid))
+            return True
         except Exception:
-            failed += 1
+            return False
 
-        if (sent + failed) % 50 == 0:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+
+    async def _worker():
+        while (uid := await queue.get()) is not None:
+            progress["sent" if await _send_one(uid) else "failed"] += 1
+
+    finished = asyncio.Event()
+
+    async def _progress_loop():
+        # Статус обновляется по времени, а не по числу отправок — воркеры не ждут edit_text
+        last_rendered = None
+        while True:
             try:
-                await status_msg.edit_text(
-                    f"📤 Рассылка: {sent + failed}/{len(user_ids)}...\n"
-                    f"✅ {sent} | ❌ {failed}"
-                )
-            except Exception:
+                await asyncio.wait_for(finished.wait(), BROADCAST_PROGRESS_INTERVAL)
+                return
+            except asyncio.TimeoutError:
                 pass
 
-        # Задержка для API limits
-        import asyncio
-        await asyncio.sleep(0.05)
+            done = progress["sent"] + progress["failed"]
+            rendered = (
+                f"📤 Рассылка: {done}/{total}...\n"
+                f"✅ {progress['sent']} | ❌ {progress['failed']}"
+            )
+            # Без изменений Telegram ответит "message is not modified" — не тратим запрос
+            if rendered == last_rendered:
+                continue
 
-    await status_msg.edit_text(
-        f"✅ <b>Рассылка завершена!</b>\n\n"
-        f"📤 Отправлено: {sent}\n"
-        f"❌ Не доставлено: {failed}\n"
-        f"📊 Всего: {len(user_ids)}"
-    )
+            try:
+                await status_msg.edit_text(rendered)
+                last_rendered = rendered
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                logger.warning(f"Broadcast progress edit failed: {e}")
+            except Exception as e:
+                # Сетевая ошибка не должна молча убивать обновление статуса
+                logger.error(f"Broadcast progress update error: {e}")
+
+    progress_task = asyncio.create_task(_progress_loop())
+    workers = [asyncio.create_task(_worker()) for _ in range(BROADCAST_WORKERS)]
+
+    # Стримим ID с сервера пачками, не держа весь список в памяти
+    completed = False
+    try:
+        async with db.session_factory() as session:
+            result = await session.stream_scalars(
+                select(User.telegram_id).execution_options(yield_per=500)
+            )
+            async for uid in result:
+                await queue.put(uid)
+        completed = True
+    except Exception as e:
+        logger.error(f"Broadcast aborted, user stream failed: {e}")
+    finally:
+        if not completed:
+            # Поток из базы оборвался: оставшиеся ID выбрасываем, воркеров останавливаем
+            while not queue.empty():
+                queue.get_nowait()
+            for task in workers:
+                task.cancel()
+        # Сентинелы и finished — при любом исходе, иначе воркеры
+        # навсегда повиснут в queue.get(), а статус будет обновляться вечно
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+        finished.set()
+        await progress_task
+
+    sent, failed = progress["sent"], progress["failed"]
+    header = "✅ <b>Рассылка завершена!</b>" if completed else "⚠️ <b>Рассылка прервана!</b>"
+
+    try:
+        await status_msg.edit_text(
+            f"{header}\n\n"
+            f"📤 Отправлено: {sent}\n"
+            f"❌ Не доставлено: {failed}\n"
+            f"📊 Всего: {sent + failed}"
+        )
+    except Exception as e:
+        logger.error(f"Broadcast final status edit failed: {e}")
 
 
 @router.message(Command("give_plan"))
@@ -180,6 +288,7 @@ async def cmd_give_plan(message: Message):
 
         db = await get_db()
         await db.activate_plan(target_id, plan, days)
+        _admin_stats_cache.clear()
 
         await message.answer(
             f"✅ План <b>{plan}</b> выдан пользователю "
@@ -189,7 +298,6 @@ async def cmd_give_plan(message: Message):
 
         # Уведомляем пользователя
         try:
-            from bot.utils.helpers import plan_badge
             await message.bot.send_message(
                 chat_id=target_id,
                 text=(
@@ -214,9 +322,6 @@ async def cmd_stats(message: Message):
     db = await get_db()
     total = await db.get_total_users()
 
-    from sqlalchemy import select, func
-    from database.models import Product, PriceRecord
-
     async with db.session_factory() as session:
         result = await session.execute(select(func.count(Product.id)))
         total_products = result.scalar() or 0
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from datetime import date
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, BufferedInputFile
@@ -6,49 +8,134 @@ from aiogram.types import CallbackQuery, BufferedInputFile
 from database.db import get_db
 from config import PlanLimits
 from bot.keyboards.inline import (
-    product_actions_kb, upgrade_kb, back_to_menu_kb
+    ProductCallback, legacy_product_filter, product_actions_kb, upgrade_kb, back_to_menu_kb
 )
-from bot.utils.helpers import format_price
+from bot.utils.helpers import format_price, delete_in_background
+from bot.utils.cache import TTLCache
 from bot.services.review_analyzer import analyze_reviews, format_review_analysis
-from bot.services.analogs_finder import find_analogs, format_analogs_result
+from bot.services.analogs_finder import (
+    find_analogs, add_ai_recommendation, format_analogs_result
+)
 from bot.services.price_predictor import predict_price, format_prediction
 from bot.services.cashback import get_cashback_info, format_cashback_info
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+AI_RESULT_TTL = 6 * 3600
+# Неполный результат (не скачались отзывы, не ответил AI, ничего не нашлось)
+# держим недолго, чтобы следующий запрос попробовал заново
+AI_FAILURE_TTL = 60
 
-# ==================== AI-АНАЛИЗ ОТЗЫВОВ ====================
+# Готовые результаты AI-функций: (функция, товар, маркетплейс, день) -> (текст, PNG)
+_ai_results = TTLCache(maxsize=2048, ttl=AI_RESULT_TTL)
 
-@router.callback_query(F.data.startswith("reviews_"))
-async def cb_ai_reviews(callback: CallbackQuery):
-    """AI-анализ отзывов (PREMIUM)"""
-    product_id = int(callback.data.replace("reviews_", ""))
+# Лимит подписи к фото в Telegram
+CAPTION_LIMIT = 1024
+PREDICT_CHART_CAPTION = "📅 <b>Средние цены по месяцам</b>"
+
+
+# Тексты-заглушки для функций, недоступных на текущем тарифе
+_UPSELL_TEXTS = {
+    "ai_reviews": (
+        "🤖 <b>AI-анализ отзывов</b>\n\n"
+        "Эта функция доступна только в тарифе PREMIUM.\n\n"
+        "Что вы получите:\n"
+        "• Выявление фейковых отзывов\n"
+        "• Реальный рейтинг товара\n"
+        "• Выжимка плюсов и минусов\n"
+        "• Рекомендация от AI\n\n"
+        "💎 Улучшите план для доступа!"
+    ),
+    "analogs": (
+        "📦 <b>Поиск аналогов</b>\n\n"
+        "Эта функция доступна только в тарифе PREMIUM.\n\n"
+        "Что вы получите:\n"
+        "• Тот же товар у других продавцов\n"
+        "• Похожие товары других брендов дешевле\n"
+        "• AI-рекомендация по соотношению цена/качество\n\n"
+        "💎 Улучшите план для доступа!"
+    ),
+    "price_predict": (
+        "📅 <b>Прогноз цен</b>\n\n"
+        "Эта функция доступна только в тарифе PREMIUM.\n\n"
+        "Что вы получите:\n"
+        "• Когда лучше покупать эту категорию\n"
+        "• Календарь цен по месяцам\n"
+        "• AI-прогноз ценовых трендов\n"
+        "• Персональные рекомендации\n\n"
+        "💎 Улучшите план для доступа!"
+    ),
+    "cashback": (
+        "💸 <b>Кешбэк и промокоды</b>\n\n"
+        "Эта функция доступна только в тарифе PREMIUM.\n\n"
+        "Что вы получите:\n"
+        "• Все доступные кешбэки на товар\n"
+        "• Советы по промокодам\n"
+        "• Расчёт финальной цены\n"
+        "• AI-советы по экономии\n\n"
+        "💎 Улучшите план для доступа!"
+    ),
+}
+
+
+async def _gate(callback: CallbackQuery, product_id: int, feature_key: str):
+    """
+    Общая проверка для AI-функций: товар существует и функция доступна по тарифу.
+    Returns: (product, active_plan) или None, если ответ пользователю уже отправлен.
+    """
     db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
+    user, product = await asyncio.gather(
+        db.get_user(callback.from_user.id),
+        db.get_product(product_id),
+    )
 
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
-        return
+        return None
 
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
+    active_plan, limits = PlanLimits.for_user(user)
 
-    if not limits.get("ai_reviews"):
-        await callback.message.edit_text(
-            "🤖 <b>AI-анализ отзывов</b>\n\n"
-            "Эта функция доступна только в тарифе PREMIUM.\n\n"
-            "Что вы получите:\n"
-            "• Выявление фейковых отзывов\n"
-            "• Реальный рейтинг товара\n"
-            "• Выжимка плюсов и минусов\n"
-            "• Рекомендация от AI\n\n"
-            "💎 Улучшите план для доступа!",
-            reply_markup=upgrade_kb(),
+    if not limits.get(feature_key):
+        await asyncio.gather(
+            callback.message.edit_text(
+                _UPSELL_TEXTS[feature_key],
+                reply_markup=upgrade_kb(),
+            ),
+            callback.answer(),
         )
-        await callback.answer()
+        return None
+
+    return product, active_plan
+
+
+async def _cached(feature: str, product, loader):
+    """
+    Результат AI-функции из кеша, либо вызов loader() с сохранением.
+    loader возвращает (text, chart_bytes | None, ok); при ok=False
+    результат кешируется только на AI_FAILURE_TTL.
+    Ключ включает дату — раз в сутки анализ пересчитывается.
+    Returns: (text, chart_bytes | None)
+    """
+    key = (feature, product.id, product.marketplace, date.today())
+    cached = _ai_results.get(key)
+    if cached is not None:
+        return cached
+
+    text, chart, ok = await loader()
+    result = (text, chart)
+    _ai_results.set(key, result, ttl=AI_RESULT_TTL if ok else AI_FAILURE_TTL)
+    return result
+
+
+# ==================== AI-АНАЛИЗ ОТЗЫВОВ ====================
+
+async def _handle_reviews(callback: CallbackQuery, product_id: int):
+    """AI-анализ отзывов (PREMIUM)"""
+    ctx = await _gate(callback, product_id, "ai_reviews")
+    if not ctx:
         return
+    product, active_plan = ctx
 
     await callback.answer("🤖 Анализирую отзывы... (может занять 15-30 сек)")
 
@@ -61,14 +148,17 @@ async def cb_ai_reviews(callback: CallbackQuery):
         "Это может занять 15-30 секунд.",
     )
 
-    try:
+    async def load():
         result = await analyze_reviews(
             marketplace=product.marketplace,
             product_id=product.external_id or str(product.id),
             product_title=product.title or "",
         )
+        ok = result["total_reviews"] > 0 and bool(result["ai_summary"])
+        return format_review_analysis(result), None, ok
 
-        text = format_review_analysis(result)
+    try:
+        text, _ = await _cached("reviews", product, load)
 
         # Обрезаем если слишком длинный
         if len(text) > 4000:
@@ -91,34 +181,12 @@ async def cb_ai_reviews(callback: CallbackQuery):
 
 # ==================== ПОИСК АНАЛОГОВ ====================
 
-@router.callback_query(F.data.startswith("analogs_"))
-async def cb_find_analogs(callback: CallbackQuery):
+async def _handle_analogs(callback: CallbackQuery, product_id: int):
     """Поиск аналогов дешевле (PREMIUM)"""
-    product_id = int(callback.data.replace("analogs_", ""))
-    db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
-
-    if not product:
-        await callback.answer("Товар не найден", show_alert=True)
-        return
-
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
-
-    if not limits.get("analogs"):
-        await callback.message.edit_text(
-            "📦 <b>Поиск аналогов</b>\n\n"
-            "Эта функция доступна только в тарифе PREMIUM.\n\n"
-            "Что вы получите:\n"
-            "• Тот же товар у других продавцов\n"
-            "• Похожие товары других брендов дешевле\n"
-            "• AI-рекомендация по соотношению цена/качество\n\n"
-            "💎 Улучшите план для доступа!",
-            reply_markup=upgrade_kb(),
-        )
-        await callback.answer()
+    ctx = await _gate(callback, product_id, "analogs")
+    if not ctx:
         return
+    product, active_plan = ctx
 
     await callback.answer("📦 Ищу аналоги...")
 
@@ -129,26 +197,40 @@ async def cb_find_analogs(callback: CallbackQuery):
         "⏳ Готовлю рекомендации...",
     )
 
-    try:
-        result = await find_analogs(
-            title=product.title or "",
-            brand=product.brand or "",
-            category=product.category or "",
-            current_price=product.current_price or 0,
-            marketplace=product.marketplace,
-        )
-
-        text = format_analogs_result(result, product.current_price or 0)
+    current_price = product.current_price or 0
 
+    async def show(text: str):
         if len(text) > 4000:
             text = text[:3950] + "\n\n... (обрезано)"
-
         await callback.message.edit_text(
             text,
             reply_markup=product_actions_kb(product_id, active_plan),
             disable_web_page_preview=True,
         )
 
+    async def load():
+        result = await find_analogs(
+            title=product.title or "",
+            brand=product.brand or "",
+            category=product.category or "",
+            current_price=current_price,
+            marketplace=product.marketplace,
+            with_ai=False,
+        )
+        # Найденные предложения показываем сразу, AI-рекомендацию дописываем следом
+        found = bool(result["same_product"] or result["cheaper_analogs"])
+        if found:
+            await show(format_analogs_result(result, current_price, ai_pending=True))
+            await add_ai_recommendation(
+                result, product.title or "", product.brand or "", current_price
+            )
+        ok = found and bool(result["ai_recommendation"])
+        return format_analogs_result(result, current_price), None, ok
+
+    try:
+        text, _ = await _cached("analogs", product, load)
+        await show(text)
+
     except Exception as e:
         logger.error(f"Analogs search error: {e}")
         await callback.message.edit_text(
@@ -159,35 +241,12 @@ async def cb_find_analogs(callback: CallbackQuery):
 
 # ==================== ПРОГНОЗ ЦЕН ====================
 
-@router.callback_query(F.data.startswith("predict_"))
-async def cb_price_predict(callback: CallbackQuery):
+async def _handle_predict(callback: CallbackQuery, product_id: int):
     """Прогноз цен + календарь (PREMIUM)"""
-    product_id = int(callback.data.replace("predict_", ""))
-    db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
-
-    if not product:
-        await callback.answer("Товар не найден", show_alert=True)
-        return
-
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
-
-    if not limits.get("price_predict"):
-        await callback.message.edit_text(
-            "📅 <b>Прогноз цен</b>\n\n"
-            "Эта функция доступна только в тарифе PREMIUM.\n\n"
-            "Что вы получите:\n"
-            "• Когда лучше покупать эту категорию\n"
-            "• Календарь цен по месяцам\n"
-            "• AI-прогноз ценовых трендов\n"
-            "• Персональные рекомендации\n\n"
-            "💎 Улучшите план для доступа!",
-            reply_markup=upgrade_kb(),
-        )
-        await callback.answer()
+    ctx = await _gate(callback, product_id, "price_predict")
+    if not ctx:
         return
+    product, active_plan = ctx
 
     await callback.answer("📅 Анализирую тренды...")
 
@@ -198,40 +257,43 @@ async def cb_price_predict(callback: CallbackQuery):
         "⏳ Запрашиваю AI...",
     )
 
-    try:
+    async def load():
         result = await predict_price(
             product_id=product_id,
             title=product.title or "",
             category=product.category or "",
             current_price=product.current_price or 0,
         )
+        return (
+            format_prediction(result, title=product.title or ""),
+            result.get("monthly_chart"),
+            result["has_history"] and bool(result["ai_prediction"]),
+        )
 
-        text = format_prediction(result, title=product.title or "")
+    try:
+        text, chart = await _cached("predict", product, load)
 
         if len(text) > 4000:
             text = text[:3950] + "\n\n... (обрезано)"
 
         # Если есть график — отправляем с фото
-        chart = result.get("monthly_chart")
         if chart:
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
+            photo = BufferedInputFile(chart, filename="prediction.png")
+
+            if len(text) <= CAPTION_LIMIT:
+                delete_in_background(callback.message)
+                caption = text
+            else:
+                # Длинный отчёт не режем посреди HTML-тегов: он заменяет
+                # сообщение-прогресс, а фото уходит с коротким заголовком
+                await callback.message.edit_text(text)
+                caption = PREDICT_CHART_CAPTION
 
-            photo = BufferedInputFile(chart.read(), filename="prediction.png")
             await callback.message.answer_photo(
                 photo=photo,
-                caption=text[:1024],  # Лимит caption
+                caption=caption,
                 reply_markup=product_actions_kb(product_id, active_plan),
             )
-
-            # Если текст длиннее caption, доотправляем
-            if len(text) > 1024:
-                await callback.message.answer(
-                    text[1024:],
-                    reply_markup=product_actions_kb(product_id, active_plan),
-                )
         else:
             await callback.message.edit_text(
                 text,
@@ -248,47 +310,30 @@ async def cb_price_predict(callback: CallbackQuery):
 
 # ==================== КЕШБЭК И ПРОМОКОДЫ ====================
 
-@router.callback_query(F.data.startswith("cashback_"))
-async def cb_cashback(callback: CallbackQuery):
+async def _handle_cashback(callback: CallbackQuery, product_id: int):
     """Кешбэк и промокоды (PREMIUM)"""
-    product_id = int(callback.data.replace("cashback_", ""))
-    db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
-
-    if not product:
-        await callback.answer("Товар не найден", show_alert=True)
-        return
-
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
-
-    if not limits.get("cashback"):
-        await callback.message.edit_text(
-            "💸 <b>Кешбэк и промокоды</b>\n\n"
-            "Эта функция доступна только в тарифе PREMIUM.\n\n"
-            "Что вы получите:\n"
-            "• Все доступные кешбэки на товар\n"
-            "• Советы по промокодам\n"
-            "• Расчёт финальной цены\n"
-            "• AI-советы по экономии\n\n"
-            "💎 Улучшите план для доступа!",
-            reply_markup=upgrade_kb(),
-        )
-        await callback.answer()
+    ctx = await _gate(callback, product_id, "cashback")
+    if not ctx:
         return
+    product, active_plan = ctx
 
     await callback.answer("💸 Собираю информацию о кешбэках...")
 
-    try:
+    async def load():
         result = await get_cashback_info(
             marketplace=product.marketplace,
             current_price=product.current_price or 0,
             title=product.title or "",
             category=product.category or "",
         )
+        return (
+            format_cashback_info(result, product.current_price or 0),
+            None,
+            bool(result["ai_tips"]),
+        )
 
-        text = format_cashback_info(result, product.current_price or 0)
+    try:
+        text, _ = await _cached("cashback", product, load)
 
         if len(text) > 4000:
             text = text[:3950] + "\n\n... (обрезано)"
@@ -303,4 +348,21 @@ async def cb_cashback(callback: CallbackQuery):
         await callback.message.edit_text(
             "❌ Ошибка при получении информации о кешбэках.",
             reply_markup=product_actions_kb(product_id, active_plan),
-        )
\ No newline at end of file
+        )
+
+
+# ==================== ДИСПЕТЧЕР ====================
+
+_DISPATCH = {
+    "reviews": _handle_reviews,
+    "analogs": _handle_analogs,
+    "predict": _handle_predict,
+    "cashback": _handle_cashback,
+}
+
+
+@router.callback_query(ProductCallback.filter(F.action.in_(_DISPATCH)))
+@router.callback_query(legacy_product_filter(_DISPATCH))
+async def cb_ai_feature(callback: CallbackQuery, callback_data: ProductCallback):
+    """Единая точка входа для AI-функций: callback_data уже разобран aiogram"""
+    await _DISPATCH[callback_data.action](callback, callback_data.product_id)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from aiogram import Router, F, Bot
@@ -9,7 +10,7 @@ from aiogram.fsm.state import State, StatesGroup
 from database.db import get_db
 from config import PlanLimits
 from bot.keyboards.inline import (
-    monitor_confirm_kb, monitors_list_kb,
+    ProductCallback, legacy_product_filter, monitor_confirm_kb, monitors_list_kb,
     upgrade_kb, back_to_menu_kb, product_actions_kb
 )
 from bot.utils.helpers import format_price
@@ -22,10 +23,8 @@ class MonitorStates(StatesGroup):
     waiting_target_price = State()
 
 
-@router.callback_query(F.data.startswith("monitor_"))
-async def cb_start_monitor(callback: CallbackQuery):
+async def _start_monitor(callback: CallbackQuery, product_id: int, state: FSMContext):
     """Начать мониторинг товара"""
-    product_id = int(callback.data.replace("monitor_", ""))
     db = await get_db()
     user = await db.get_user(callback.from_user.id)
 
@@ -37,29 +36,31 @@ async def cb_start_monitor(callback: CallbackQuery):
     limits = PlanLimits.get(active_plan)
 
     if not limits.get("notifications"):
-        await callback.message.edit_text(
-            "🔔 <b>Мониторинг цен</b>\n\n"
-            "Эта функция доступна в тарифах PRO и PREMIUM.\n\n"
-            "• PRO: мониторинг до 20 товаров\n"
-            "• PREMIUM: мониторинг до 50 товаров\n\n"
-            "💎 Улучшите план!",
-            reply_markup=upgrade_kb(),
+        await asyncio.gather(
+            callback.message.edit_text(
+                "🔔 <b>Мониторинг цен</b>\n\n"
+                "Эта функция доступна в тарифах PRO и PREMIUM.\n\n"
+                "• PRO: мониторинг до 20 товаров\n"
+                "• PREMIUM: мониторинг до 50 товаров\n\n"
+                "💎 Улучшите план!",
+                reply_markup=upgrade_kb(),
+            ),
+            callback.answer(),
         )
-        await callback.answer()
         return
 
-    await callback.message.edit_text(
-        "🔔 <b>Настройка мониторинга</b>\n\n"
-        "Выберите тип уведомлений:",
-        reply_markup=monitor_confirm_kb(product_id),
+    await asyncio.gather(
+        callback.message.edit_text(
+            "🔔 <b>Настройка мониторинга</b>\n\n"
+            "Выберите тип уведомлений:",
+            reply_markup=monitor_confirm_kb(product_id),
+        ),
+        callback.answer(),
     )
-    await callback.answer()
 
 
-@router.callback_query(F.data.startswith("mon_any_"))
-async def cb_monitor_any(callback: CallbackQuery):
+async def _monitor_any(callback: CallbackQuery, product_id: int, state: FSMContext):
     """Мониторить любое снижение"""
-    product_id = int(callback.data.replace("mon_any_", ""))
     db = await get_db()
     user = await db.get_user(callback.from_user.id)
 
@@ -91,24 +92,23 @@ async def cb_monitor_any(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("mon_target_"))
-async def cb_monitor_target(callback: CallbackQuery, state: FSMContext):
+async def _monitor_target(callback: CallbackQuery, product_id: int, state: FSMContext):
     """Указать целевую цену"""
-    product_id = int(callback.data.replace("mon_target_", ""))
-
     await state.update_data(monitor_product_id=product_id)
     await state.set_state(MonitorStates.waiting_target_price)
 
     db = await get_db()
     product = await db.get_product(product_id)
 
-    await callback.message.edit_text(
-        f"🎯 <b>Укажите желаемую цену</b>\n\n"
-        f"📦 {product.title[:60] if product and product.title else 'Товар'}\n"
-        f"💰 Текущая: {format_price(product.current_price) if product else 'N/A'}\n\n"
-        f"Введите цену в рублях (только число):",
+    await asyncio.gather(
+        callback.message.edit_text(
+            f"🎯 <b>Укажите желаемую цену</b>\n\n"
+            f"📦 {product.title[:60] if product and product.title else 'Товар'}\n"
+            f"💰 Текущая: {format_price(product.current_price) if product else 'N/A'}\n\n"
+            f"Введите цену в рублях (только число):",
+        ),
+        callback.answer(),
     )
-    await callback.answer()
 
 
 @router.message(MonitorStates.waiting_target_price)
@@ -160,15 +160,23 @@ async def handle_target_price(message: Message, state: FSMContext):
 
 # ==================== СПИСОК МОНИТОРИНГА ====================
 
-@router.message(Command("monitors"))
-@router.message(F.text == "📊 Мои товары")
-async def cmd_monitors(message: Message):
-    logger.info(f"MONITORS from {message.from_user.id}")
-    db = await get_db()
-    monitors = await db.get_user_monitors(message.from_user.id)
-    
+def _monitor_line(i: int, item: dict) -> str:
+    product = item["product"]
+    monitor = item["monitor"]
+    title = product.title[:40] if product.title else f"Товар #{product.id}"
+    line = f"{i}. 📦 <b>{title}</b>\n   💰 {format_price(product.current_price)}"
+    if monitor.target_price:
+        line += f" | 🎯 {format_price(monitor.target_price)}"
+    return line
+
+
+async def _render_monitors_list(send, monitors: list):
+    """
+    Выводит список отслеживаемых товаров.
+    send — message.answer или callback.message.edit_text.
+    """
     if not monitors:
-        await message.answer(
+        await send(
             "📊 <b>Мои товары</b>\n\n"
             "Список пуст.\n\n"
             "Чтобы добавить товар:\n"
@@ -178,57 +186,33 @@ async def cmd_monitors(message: Message):
         )
         return
 
-    text = f"📊 <b>Отслеживаемые товары ({len(monitors)})</b>\n\n"
-    for i, item in enumerate(monitors, 1):
-        product = item["product"]
-        monitor = item["monitor"]
-        title = product.title[:40] if product.title else f"Товар #{product.id}"
-        text += f"{i}. 📦 <b>{title}</b>\n"
-        text += f"   💰 {format_price(product.current_price)}"
-        if monitor.target_price:
-            text += f" | 🎯 {format_price(monitor.target_price)}"
-        text += "\n"
-
-    await message.answer(text, reply_markup=monitors_list_kb(monitors)),
-    await callback.answer()
+    text = f"📊 <b>Отслеживаемые товары ({len(monitors)})</b>\n\n" + "\n".join(
+        _monitor_line(i, item) for i, item in enumerate(monitors, 1)
+    )
+    await send(text, reply_markup=monitors_list_kb(monitors))
 
 
-async def _show_monitors(message: Message):
+@router.message(Command("monitors"))
+@router.message(F.text == "📊 Мои товары")
+async def cmd_monitors(message: Message):
+    logger.info(f"MONITORS from {message.from_user.id}")
     db = await get_db()
     monitors = await db.get_user_monitors(message.from_user.id)
+    await _render_monitors_list(message.answer, monitors)
 
-    if not monitors:
-        await message.answer(
-            "📊 <b>Мои товары</b>\n\n"
-            "Список пуст. Отправь ссылку на товар и добавь в мониторинг! 🔔",
-            reply_markup=back_to_menu_kb(),
-        )
-        return
-
-    text = f"📊 <b>Отслеживаемые товары ({len(monitors)})</b>\n\n"
-
-    for i, item in enumerate(monitors, 1):
-        product = item["product"]
-        monitor = item["monitor"]
-        title = product.title[:40] if product.title else f"Товар #{product.id}"
-
-        text += f"{i}. 📦 <b>{title}</b>\n"
-        text += f"   💰 {format_price(product.current_price)}"
 
-        if monitor.target_price:
-            text += f" | 🎯 {format_price(monitor.target_price)}"
-        text += "\n"
-
-    await message.answer(
-        text,
-        reply_markup=monitors_list_kb(monitors),
+@router.callback_query(F.data == "my_monitors")
+async def cb_my_monitors(callback: CallbackQuery):
+    db = await get_db()
+    monitors = await db.get_user_monitors(callback.from_user.id)
+    await asyncio.gather(
+        _render_monitors_list(callback.message.edit_text, monitors),
+        callback.answer(),
     )
 
 
-@router.callback_query(F.data.startswith("unmonitor_"))
-async def cb_unmonitor(callback: CallbackQuery):
+async def _unmonitor(callback: CallbackQuery, product_id: int, state: FSMContext):
     """Удалить из мониторинга"""
-    product_id = int(callback.data.replace("unmonitor_", ""))
     db = await get_db()
     user = await db.get_user(callback.from_user.id)
 
@@ -239,22 +223,23 @@ async def cb_unmonitor(callback: CallbackQuery):
 
     # Обновляем список
     monitors = await db.get_user_monitors(callback.from_user.id)
+    await _render_monitors_list(callback.message.edit_text, monitors)
 
-    if not monitors:
-        await callback.message.edit_text(
-            "📊 <b>Мои товары</b>\n\nСписок пуст.",
-            reply_markup=back_to_menu_kb(),
-        )
-    else:
-        text = f"📊 <b>Отслеживаемые товары ({len(monitors)})</b>\n\n"
-        for i, item in enumerate(monitors, 1):
-            product = item["product"]
-            title = product.title[:40] if product.title else f"Товар #{product.id}"
-            text += f"{i}. 📦 {title} — {format_price(product.current_price)}\n"
 
-        await callback.message.edit_text(
-            text,
-            reply_markup=monitors_list_kb(monitors),
+# ==================== ДИСПЕТЧЕР ====================
+
+_DISPATCH = {
+    "monitor": _start_monitor,
+    "mon_any": _monitor_any,
+    "mon_target": _monitor_target,
+    "unmonitor": _unmonitor,
+}
 
-        )
 
+@router.callback_query(ProductCallback.filter(F.action.in_(_DISPATCH)))
+@router.callback_query(legacy_product_filter(_DISPATCH))
+async def cb_monitor_action(
+    callback: CallbackQuery, callback_data: ProductCallback, state: FSMContext
+):
+    """Единая точка входа для действий мониторинга"""
+    await _DISPATCH[callback_data.action](callback, callback_data.product_id, state)
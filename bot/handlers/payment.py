@@ -1,6 +1,8 @@
+import asyncio
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
+from aiogram.enums import ParseMode
 
 from database.db import get_db
 from bot.keyboards.inline import plans_kb, payment_kb, back_to_menu_kb, main_menu_kb
@@ -45,19 +47,22 @@ PLANS_TEXT = """
 └──────────────────────────────────┘
 """
 
+# Текст тарифов статичен — параметры отправки собираем один раз
+PLANS_PAYLOAD = {"text": PLANS_TEXT, "parse_mode": ParseMode.HTML}
+
 
 @router.message(Command("plans"))
 @router.message(F.text == "💎 Тарифы")
 async def cmd_plans(message: Message):
-    await message.answer(PLANS_TEXT, parse_mode="HTML", reply_markup=plans_kb())
+    await message.answer(**PLANS_PAYLOAD, reply_markup=plans_kb())
 
 
 @router.callback_query(F.data == "plans")
 async def cb_plans(callback: CallbackQuery):
-    await callback.message.edit_text(
-        PLANS_TEXT, parse_mode="HTML", reply_markup=plans_kb()
+    await asyncio.gather(
+        callback.message.edit_text(**PLANS_PAYLOAD, reply_markup=plans_kb()),
+        callback.answer(),
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data.in_({"buy_pro", "buy_premium"}))
@@ -111,7 +116,7 @@ async def cb_buy_plan(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("check_payment_"))
 async def cb_check_payment(callback: CallbackQuery):
-    payment_id = callback.data.replace("check_payment_", "")
+    payment_id = callback.data.removeprefix("check_payment_")
 
     status = await check_payment_status(payment_id)
 
@@ -120,17 +125,23 @@ async def cb_check_payment(callback: CallbackQuery):
         payment = await db.complete_payment(payment_id)
 
         if payment:
-            await callback.message.edit_text(
-                f"🎉 <b>Оплата прошла успешно!</b>\n\n"
-                f"✅ Тариф {plan_badge(payment.plan)} активирован на 30 дней!\n\n"
-                f"Наслаждайся всеми возможностями PriceGhost! 👻",
-                parse_mode="HTML",
-                reply_markup=main_menu_kb(),
+            await asyncio.gather(
+                callback.message.edit_text(
+                    f"🎉 <b>Оплата прошла успешно!</b>\n\n"
+                    f"✅ Тариф {plan_badge(payment.plan)} активирован на 30 дней!\n\n"
+                    f"Наслаждайся всеми возможностями PriceGhost! 👻",
+                    parse_mode="HTML",
+                    reply_markup=main_menu_kb(),
+                ),
+                callback.answer(),
             )
         else:
-            await callback.message.edit_text(
-                "❌ Платёж не найден в базе данных.",
-                reply_markup=back_to_menu_kb(),
+            await asyncio.gather(
+                callback.message.edit_text(
+                    "❌ Платёж не найден в базе данных.",
+                    reply_markup=back_to_menu_kb(),
+                ),
+                callback.answer(),
             )
     elif status == "pending":
         await callback.answer(
@@ -138,9 +149,12 @@ async def cb_check_payment(callback: CallbackQuery):
             show_alert=True,
         )
     elif status == "canceled":
-        await callback.message.edit_text(
-            "❌ Платёж был отменён.",
-            reply_markup=plans_kb(),
+        await asyncio.gather(
+            callback.message.edit_text(
+                "❌ Платёж был отменён.",
+                reply_markup=plans_kb(),
+            ),
+            callback.answer(),
         )
     else:
         await callback.answer(
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import re
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, BufferedInputFile
@@ -9,29 +11,47 @@ from bot.utils.url_parser import (
     parse_marketplace_url, resolve_short_url,
     get_marketplace_emoji, get_marketplace_name
 )
-from bot.utils.helpers import format_price, format_percent, plan_badge
+from bot.utils.helpers import format_price, format_percent, plan_badge, delete_in_background
 from bot.keyboards.inline import (
-    product_actions_kb, upgrade_kb, back_to_menu_kb
+    ProductCallback, legacy_product_filter, product_actions_kb, upgrade_kb, back_to_menu_kb
 )
 from bot.services.price_history import fetch_and_save_price, get_price_stats
-from bot.services.chart import generate_price_chart
 from bot.services.fake_discount import analyze_fake_discount
+from bot.services.search_cheaper import find_cheaper, format_cheaper_results
+from bot.services.seller_check import check_seller, format_seller_check
+from bot.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+URL_RE = re.compile(r"https?://")
+URL_FIND_RE = re.compile(r"https?://\S+")
 
-@router.message(F.text.regexp(r"https?://"))
+_TREND_EMOJI = {"up": "📈", "down": "📉", "stable": "➡️"}
+_TREND_TEXT = {"up": "Растёт", "down": "Падает", "stable": "Стабильна"}
+
+# Все 11 вариантов шкалы уверенности (0..100% с шагом 10)
+_CONFIDENCE_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
+# Рейтинг 0..5 звёзд
+_STAR_STRINGS = tuple("⭐" * i + "☆" * (5 - i) for i in range(6))
+
+# Повторная ссылка на тот же товар в течение этого времени не скрапится заново
+RECENT_PRODUCT_TTL = 30
+_recent_products = TTLCache(maxsize=1024, ttl=RECENT_PRODUCT_TTL)
+
+
+# Дешёвая проверка префикса отсекает кнопки меню и обычный текст до regex
+@router.message(F.text.startswith("http") & F.text.regexp(URL_RE))
 async def handle_url(message: Message):
     """Обработка ссылки на товар"""
     url = message.text.strip()
 
     # Если в тексте несколько слов — ищем URL
     if " " in url:
-        import re
-        urls = re.findall(r'https?://\S+', url)
-        if urls:
-            url = urls[0]
+        found = URL_FIND_RE.search(url)
+        if found:
+            url = found.group(0)
         else:
             return
 
@@ -57,10 +77,7 @@ async def handle_url(message: Message):
                 "Попробуйте скопировать полную ссылку на товар с Ozon."
             )
             return
-        try:
-            await loading.delete()
-        except:
-            pass
+        delete_in_background(loading)
 
     if not marketplace:
         await message.answer(
@@ -74,16 +91,20 @@ async def handle_url(message: Message):
         )
         return
 
+    await _check_product(message, marketplace, product_id, clean_url or url)
+
+
+async def _check_product(message: Message, marketplace: str, product_id: str, url: str):
+    """Проверка товара: списание лимита, скрапинг и ответ"""
     db = await get_db()
-    user = await db.get_or_create_user(
+
+    # Регистрируем пользователя и списываем проверку одним запросом
+    user, allowed, used, limit = await db.ensure_user_and_consume_quota(
         telegram_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
     )
 
-    # Проверяем лимит
-    allowed, used, limit = await db.check_and_increment_usage(message.from_user.id)
-
     if not allowed:
         await message.answer(
             f"⛔ <b>Лимит исчерпан!</b>\n\n"
@@ -103,10 +124,15 @@ async def handle_url(message: Message):
         f"📊 Проверка {used}/{limit}",
     )
 
-    # Скрапим и сохраняем
-    product_data = await fetch_and_save_price(
-        marketplace, product_id, clean_url or url
-    )
+    # Скрапим и сохраняем (если ссылку только что проверяли — берём готовое)
+    cache_key = (marketplace, product_id)
+    product_data = _recent_products.get(cache_key)
+    if product_data is None:
+        product_data = await fetch_and_save_price(
+            marketplace, product_id, url, stats_days=365
+        )
+        if product_data:
+            _recent_products.set(cache_key, product_data)
 
     if not product_data:
         await loading_msg.edit_text(
@@ -132,50 +158,51 @@ async def handle_url(message: Message):
     brand = product_data.get("brand", "")
     seller = product_data.get("seller_name", "")
 
-    stats = await get_price_stats(db_id, days=365)
+    stats = product_data["stats"]
 
-    text = f"👻 <b>PriceGhost</b> — Результат\n\n"
-    text += f"{mp_emoji} <b>{mp_name}</b>\n"
-    text += f"📦 <b>{title}</b>\n\n"
+    parts = [
+        f"👻 <b>PriceGhost</b> — Результат\n\n",
+        f"{mp_emoji} <b>{mp_name}</b>\n",
+        f"📦 <b>{title}</b>\n\n",
+    ]
 
     if brand:
-        text += f"🏷 Бренд: {brand}\n"
+        parts.append(f"🏷 Бренд: {brand}\n")
     if seller:
-        text += f"🏪 Продавец: {seller}\n"
+        parts.append(f"🏪 Продавец: {seller}\n")
 
-    text += f"\n💰 <b>Цена: {format_price(current_price)}</b>\n"
+    parts.append(f"\n💰 <b>Цена: {format_price(current_price)}</b>\n")
 
     if discount > 0 and original_price > current_price:
-        text += f"🏷 До скидки: <s>{format_price(original_price)}</s>\n"
-        text += f"📉 Скидка: <b>-{discount:.0f}%</b>\n"
+        parts.append(f"🏷 До скидки: <s>{format_price(original_price)}</s>\n")
+        parts.append(f"📉 Скидка: <b>-{discount:.0f}%</b>\n")
 
     if rating > 0:
-        stars = "⭐" * int(rating) + "☆" * (5 - int(rating))
-        text += f"\n{stars} {rating}/5"
+        stars = _STAR_STRINGS[min(5, int(rating))]
+        parts.append(f"\n{stars} {rating}/5")
         if reviews > 0:
-            text += f" ({reviews:,} отзывов)"
-        text += "\n"
+            parts.append(f" ({reviews:,} отзывов)")
+        parts.append("\n")
 
     if stats.get("has_data") and stats["records_count"] > 1:
-        text += f"\n📊 <b>Статистика:</b>\n"
-        text += f"├ 📉 Минимум: {format_price(stats['min_price'])}\n"
-        text += f"├ 📈 Максимум: {format_price(stats['max_price'])}\n"
-        text += f"├ 📊 Средняя: {format_price(stats['avg_price'])}\n"
-
-        trend_emoji = {"up": "📈", "down": "📉", "stable": "➡️"}
-        trend_text = {"up": "Растёт", "down": "Падает", "stable": "Стабильна"}
         trend = stats["trend"]
-        text += (
-            f"└ {trend_emoji[trend]} Тренд: <b>{trend_text[trend]}</b>"
-            f" ({format_percent(stats['trend_percent'])})\n"
-        )
+        parts += [
+            f"\n📊 <b>Статистика:</b>\n",
+            f"├ 📉 Минимум: {format_price(stats['min_price'])}\n",
+            f"├ 📈 Максимум: {format_price(stats['max_price'])}\n",
+            f"├ 📊 Средняя: {format_price(stats['avg_price'])}\n",
+            f"└ {_TREND_EMOJI[trend]} Тренд: <b>{_TREND_TEXT[trend]}</b>"
+            f" ({format_percent(stats['trend_percent'])})\n",
+        ]
 
         if current_price <= stats["min_price"] * 1.05:
-            text += "\n🎉 <b>Отличная цена! Близко к минимуму.</b>"
+            parts.append("\n🎉 <b>Отличная цена! Близко к минимуму.</b>")
         elif current_price >= stats["max_price"] * 0.95:
-            text += "\n⚠️ <b>Цена близка к максимуму. Лучше подождать.</b>"
+            parts.append("\n⚠️ <b>Цена близка к максимуму. Лучше подождать.</b>")
     else:
-        text += "\n📊 Отслеживание начато! Данные накопятся за несколько дней."
+        parts.append("\n📊 Отслеживание начато! Данные накопятся за несколько дней.")
+
+    text = "".join(parts)
 
     active_plan = user.active_plan
 
@@ -187,12 +214,12 @@ async def handle_url(message: Message):
 
 # ==================== ДЕЙСТВИЯ С ТОВАРОМ ====================
 
-@router.callback_query(F.data.startswith("product_"))
-async def cb_product_info(callback: CallbackQuery):
-    product_id = int(callback.data.replace("product_", ""))
+async def _product_info(callback: CallbackQuery, product_id: int):
     db = await get_db()
-    product = await db.get_product(product_id)
-    user = await db.get_user(callback.from_user.id)
+    user, product = await asyncio.gather(
+        db.get_user(callback.from_user.id),
+        db.get_product(product_id),
+    )
 
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
@@ -201,36 +228,39 @@ async def cb_product_info(callback: CallbackQuery):
     mp_emoji = get_marketplace_emoji(product.marketplace)
     mp_name = get_marketplace_name(product.marketplace)
 
-    text = (
-        f"👻 <b>PriceGhost</b>\n\n"
-        f"{mp_emoji} <b>{mp_name}</b>\n"
-        f"📦 {product.title or 'Без названия'}\n\n"
-        f"💰 Цена: <b>{format_price(product.current_price)}</b>\n"
-    )
+    parts = [
+        f"👻 <b>PriceGhost</b>\n\n",
+        f"{mp_emoji} <b>{mp_name}</b>\n",
+        f"📦 {product.title or 'Без названия'}\n\n",
+        f"💰 Цена: <b>{format_price(product.current_price)}</b>\n",
+    ]
 
     if product.original_price and product.original_price > (product.current_price or 0):
-        text += f"🏷 До скидки: <s>{format_price(product.original_price)}</s>\n"
+        parts.append(f"🏷 До скидки: <s>{format_price(product.original_price)}</s>\n")
+
+    text = "".join(parts)
 
     active_plan = user.active_plan if user else "FREE"
-    await callback.message.edit_text(
-        text, reply_markup=product_actions_kb(product_id, active_plan)
+    await asyncio.gather(
+        callback.message.edit_text(
+            text, reply_markup=product_actions_kb(product_id, active_plan)
+        ),
+        callback.answer(),
     )
-    await callback.answer()
 
 
-@router.callback_query(F.data.startswith("history_"))
-async def cb_price_history(callback: CallbackQuery):
-    product_id = int(callback.data.replace("history_", ""))
+async def _price_history(callback: CallbackQuery, product_id: int):
     db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
+    user, product = await asyncio.gather(
+        db.get_user(callback.from_user.id),
+        db.get_product(product_id),
+    )
 
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
         return
 
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
+    active_plan, limits = PlanLimits.for_user(user)
     days = limits["history_days"]
 
     await callback.answer("📊 Генерирую...")
@@ -266,6 +296,8 @@ async def cb_price_history(callback: CallbackQuery):
         )
         return
 
+    # matplotlib грузим только когда действительно нужен график
+    from bot.services.chart import generate_price_chart
     chart = await generate_price_chart(
         records=stats["records"],
         title=title,
@@ -284,12 +316,9 @@ async def cb_price_history(callback: CallbackQuery):
         f"📝 Записей: {stats['records_count']}"
     )
 
-    photo = BufferedInputFile(chart.read(), filename="price_chart.png")
+    photo = BufferedInputFile(chart, filename="price_chart.png")
 
-    try:
-        await callback.message.delete()
-    except:
-        pass
+    delete_in_background(callback.message)
 
     await callback.message.answer_photo(
         photo=photo,
@@ -298,12 +327,12 @@ async def cb_price_history(callback: CallbackQuery):
     )
 
 
-@router.callback_query(F.data.startswith("fake_"))
-async def cb_fake_discount(callback: CallbackQuery):
-    product_id = int(callback.data.replace("fake_", ""))
+async def _fake_discount(callback: CallbackQuery, product_id: int):
     db = await get_db()
-    product = await db.get_product(product_id)
-    user = await db.get_user(callback.from_user.id)
+    user, product = await asyncio.gather(
+        db.get_user(callback.from_user.id),
+        db.get_product(product_id),
+    )
 
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
@@ -317,24 +346,26 @@ async def cb_fake_discount(callback: CallbackQuery):
         original_price=product.original_price or 0,
     )
 
-    bar_filled = int(result["confidence"] / 10)
-    bar = "█" * bar_filled + "░" * (10 - bar_filled)
+    bar = _CONFIDENCE_BARS[min(max(int(result["confidence"] / 10), 0), 10)]
 
-    text = f"🚨 <b>Детектор фейковых скидок</b>\n\n"
-    text += f"📦 {(product.title or 'Товар')[:60]}\n\n"
+    parts = [
+        f"🚨 <b>Детектор фейковых скидок</b>\n\n",
+        f"📦 {(product.title or 'Товар')[:60]}\n\n",
+    ]
 
     if result["is_fake"]:
-        text += f"🔴 <b>ФЕЙКОВАЯ СКИДКА</b> ({result['confidence']}%)\n"
+        parts.append(f"🔴 <b>ФЕЙКОВАЯ СКИДКА</b> ({result['confidence']}%)\n")
     else:
-        text += f"🟢 <b>Скидка честная</b> ({result['confidence']}%)\n"
+        parts.append(f"🟢 <b>Скидка честная</b> ({result['confidence']}%)\n")
 
-    text += f"[{bar}]\n\n"
-    text += result["verdict"] + "\n"
+    parts.append(f"[{bar}]\n\n")
+    parts.append(result["verdict"] + "\n")
 
     if result["details"]:
-        text += "\n<b>Детали:</b>\n"
-        for d in result["details"]:
-            text += f"  {d}\n"
+        parts.append("\n<b>Детали:</b>\n")
+        parts.extend(f"  {d}\n" for d in result["details"])
+
+    text = "".join(parts)
 
     active_plan = user.active_plan if user else "FREE"
     await callback.message.edit_text(
@@ -342,33 +373,31 @@ async def cb_fake_discount(callback: CallbackQuery):
     )
 
 
-@router.callback_query(F.data.startswith("cheaper_"))
-async def cb_find_cheaper(callback: CallbackQuery):
-    product_id = int(callback.data.replace("cheaper_", ""))
+async def _find_cheaper(callback: CallbackQuery, product_id: int):
     db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
-
-    if not product:
-        await callback.answer("Товар не найден", show_alert=True)
-        return
 
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
+    # Сначала тариф (обычно из кеша), товар грузим только если доступ есть
+    active_plan, limits = PlanLimits.for_user(await db.get_user(callback.from_user.id))
 
     if not limits.get("search_cheaper"):
-        await callback.message.edit_text(
-            "🔍 <b>Поиск дешевле</b>\n\n"
-            "Доступно в PRO и PREMIUM.\n\n"
-            "💎 Улучшите план!",
-            reply_markup=upgrade_kb(),
+        await asyncio.gather(
+            callback.message.edit_text(
+                "🔍 <b>Поиск дешевле</b>\n\n"
+                "Доступно в PRO и PREMIUM.\n\n"
+                "💎 Улучшите план!",
+                reply_markup=upgrade_kb(),
+            ),
+            callback.answer(),
         )
-        await callback.answer()
+        return
+
+    product = await db.get_product(product_id)
+    if not product:
+        await callback.answer("Товар не найден", show_alert=True)
         return
 
     await callback.answer("🔍 Ищу...")
 
-    from bot.services.search_cheaper import find_cheaper, format_cheaper_results
     results = await find_cheaper(
         title=product.title or "",
         current_price=product.current_price or 0,
@@ -384,31 +413,29 @@ async def cb_find_cheaper(callback: CallbackQuery):
     )
 
 
-@router.callback_query(F.data.startswith("seller_"))
-async def cb_seller_check(callback: CallbackQuery):
-    product_id = int(callback.data.replace("seller_", ""))
+async def _seller_check(callback: CallbackQuery, product_id: int):
     db = await get_db()
-    user = await db.get_user(callback.from_user.id)
-    product = await db.get_product(product_id)
 
-    if not product:
-        await callback.answer("Товар не найден", show_alert=True)
-        return
-
-    active_plan = user.active_plan if user else "FREE"
-    limits = PlanLimits.get(active_plan)
+    # Сначала тариф (обычно из кеша), товар грузим только если доступ есть
+    active_plan, limits = PlanLimits.for_user(await db.get_user(callback.from_user.id))
 
     if not limits.get("seller_check"):
-        await callback.message.edit_text(
-            "🛡 <b>Проверка продавца</b>\n\nДоступно в PRO и PREMIUM.",
-            reply_markup=upgrade_kb(),
+        await asyncio.gather(
+            callback.message.edit_text(
+                "🛡 <b>Проверка продавца</b>\n\nДоступно в PRO и PREMIUM.",
+                reply_markup=upgrade_kb(),
+            ),
+            callback.answer(),
         )
-        await callback.answer()
+        return
+
+    product = await db.get_product(product_id)
+    if not product:
+        await callback.answer("Товар не найден", show_alert=True)
         return
 
     await callback.answer("🛡 Проверяю...")
 
-    from bot.services.seller_check import check_seller, format_seller_check
     result = await check_seller(
         marketplace=product.marketplace,
         seller_id=product.seller_id or "",
@@ -423,3 +450,21 @@ async def cb_seller_check(callback: CallbackQuery):
     await callback.message.edit_text(
         text, reply_markup=product_actions_kb(product_id, active_plan)
     )
+
+
+# ==================== ДИСПЕТЧЕР ====================
+
+_ACTIONS = {
+    "product": _product_info,
+    "history": _price_history,
+    "fake": _fake_discount,
+    "cheaper": _find_cheaper,
+    "seller": _seller_check,
+}
+
+
+@router.callback_query(ProductCallback.filter(F.action.in_(_ACTIONS)))
+@router.callback_query(legacy_product_filter(_ACTIONS))
+async def cb_product_action(callback: CallbackQuery, callback_data: ProductCallback):
+    """Единая точка входа для действий с товаром"""
+    await _ACTIONS[callback_data.action](callback, callback_data.product_id)
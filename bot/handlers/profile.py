@@ -1,3 +1,4 @@
+import asyncio
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -9,6 +10,26 @@ from config import PlanLimits
 
 router = Router()
 
+# Статичные части профиля — на каждый показ подставляются только значения
+_PROFILE_HEADER = (
+    "\n👤 <b>Твой профиль</b>\n\n"
+    "🆔 ID: <code>{telegram_id}</code>\n"
+    "📛 Имя: {name}\n"
+    "📋 Тариф: {badge}\n"
+)
+_PROFILE_USAGE = (
+    "\n📊 <b>Использование сегодня:</b>\n"
+    "├ Проверок: {used} / {limit}\n"
+)
+_PROFILE_FOOTER_FREE = (
+    "\n📅 Дата регистрации: {created}\n\n"
+    "💎 Хочешь больше возможностей? Жми «Тарифы»!\n"
+)
+_PROFILE_FOOTER_PAID = (
+    "\n📅 Дата регистрации: {created}\n\n"
+    "✨ Спасибо за подписку!\n"
+)
+
 
 async def get_profile_text(telegram_id: int) -> str:
     db = await get_db()
@@ -19,34 +40,30 @@ async def get_profile_text(telegram_id: int) -> str:
     active_plan = user.active_plan
     limits = PlanLimits.get(active_plan)
 
-    text = f"""
-👤 <b>Твой профиль</b>
-
-🆔 ID: <code>{user.telegram_id}</code>
-📛 Имя: {user.first_name or 'Не указано'}
-📋 Тариф: {plan_badge(active_plan)}
-"""
+    parts = [
+        _PROFILE_HEADER.format(
+            telegram_id=user.telegram_id,
+            name=user.first_name or "Не указано",
+            badge=plan_badge(active_plan),
+        )
+    ]
 
     if active_plan != "FREE" and user.plan_expires_at:
-        text += f"⏳ Действует до: {format_datetime(user.plan_expires_at)}\n"
+        parts.append(f"⏳ Действует до: {format_datetime(user.plan_expires_at)}\n")
 
-    text += f"""
-📊 <b>Использование сегодня:</b>
-├ Проверок: {user.checks_today} / {limits['checks_per_day']}
-"""
+    parts.append(_PROFILE_USAGE.format(used=user.checks_today, limit=limits["checks_per_day"]))
 
     if limits["monitor_items"] > 0:
         monitors = await db.get_user_monitors(telegram_id)
-        text += f"├ Мониторинг: {len(monitors)} / {limits['monitor_items']}\n"
+        parts.append(f"├ Мониторинг: {len(monitors)} / {limits['monitor_items']}\n")
     else:
-        text += "├ Мониторинг: ❌ (доступно в PRO)\n"
-
-    text += f"""
-📅 Дата регистрации: {format_datetime(user.created_at)}
+        parts.append("├ Мониторинг: ❌ (доступно в PRO)\n")
 
-{'💎 Хочешь больше возможностей? Жми «Тарифы»!' if active_plan == 'FREE' else '✨ Спасибо за подписку!'}
-"""
-    return text
+    parts.append(
+        (_PROFILE_FOOTER_FREE if active_plan == "FREE" else _PROFILE_FOOTER_PAID)
+        .format(created=format_datetime(user.created_at))
+    )
+    return "".join(parts)
 
 
 @router.message(Command("profile"))
@@ -59,5 +76,7 @@ async def cmd_profile(message: Message):
 @router.callback_query(F.data == "profile")
 async def cb_profile(callback: CallbackQuery):
     text = await get_profile_text(callback.from_user.id)
-    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=main_menu_kb())
-    await callback.answer()
\ No newline at end of file
+    await asyncio.gather(
+        callback.message.edit_text(text, parse_mode="HTML", reply_markup=main_menu_kb()),
+        callback.answer(),
+    )
\ No newline at end of file
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from aiogram import Router, F
@@ -35,6 +36,20 @@ HELP_TEXT = (
     "/help — Помощь"
 )
 
+CHECK_PRICE_TEXT = (
+    "🔍 <b>Проверка товара</b>\n\n"
+    "Отправь мне ссылку на товар:\n\n"
+    "🟣 Wildberries\n"
+    "🔵 Ozon\n"
+    "🟠 AliExpress\n"
+    "🟡 Amazon\n\n"
+    "Просто вставь ссылку в чат 👇"
+)
+
+# Статичные экраны — параметры отправки собираем один раз
+WELCOME_PAYLOAD = {"text": WELCOME_TEXT, "reply_markup": main_menu_kb()}
+HELP_PAYLOAD = {"text": HELP_TEXT, "reply_markup": main_menu_kb()}
+
 
 @router.message(CommandStart())
 async def cmd_start(message: Message):
@@ -52,7 +67,7 @@ async def cmd_start(message: Message):
         logger.error(f"DB error in start: {e}")
 
     try:
-        await message.answer(WELCOME_TEXT, reply_markup=main_menu_kb())
+        await message.answer(**WELCOME_PAYLOAD)
         logger.info(f"Welcome sent to {message.from_user.id}")
     except Exception as e:
         logger.error(f"Send error in start: {e}")
@@ -67,33 +82,31 @@ async def cmd_start(message: Message):
 @router.message(F.text == "❓ Помощь")
 async def cmd_help(message: Message):
     logger.info(f"HELP from {message.from_user.id}")
-    await message.answer(HELP_TEXT, reply_markup=main_menu_kb())
+    await message.answer(**HELP_PAYLOAD)
 
 
 @router.callback_query(F.data == "help")
 async def cb_help(callback: CallbackQuery):
-    await callback.message.edit_text(HELP_TEXT, reply_markup=main_menu_kb())
-    await callback.answer()
+    await asyncio.gather(
+        callback.message.edit_text(**HELP_PAYLOAD),
+        callback.answer(),
+    )
 
 
 @router.callback_query(F.data == "back_to_menu")
 async def cb_back_to_menu(callback: CallbackQuery):
-    await callback.message.edit_text(WELCOME_TEXT, reply_markup=main_menu_kb())
-    await callback.answer()
+    await asyncio.gather(
+        callback.message.edit_text(**WELCOME_PAYLOAD),
+        callback.answer(),
+    )
 
 
 @router.callback_query(F.data == "check_price")
 async def cb_check_price(callback: CallbackQuery):
-    await callback.message.edit_text(
-        "🔍 <b>Проверка товара</b>\n\n"
-        "Отправь мне ссылку на товар:\n\n"
-        "🟣 Wildberries\n"
-        "🔵 Ozon\n"
-        "🟠 AliExpress\n"
-        "🟡 Amazon\n\n"
-        "Просто вставь ссылку в чат 👇",
+    await asyncio.gather(
+        callback.message.edit_text(CHECK_PRICE_TEXT),
+        callback.answer(),
     )
-    await callback.answer()
 
 
 @router.message(F.text == "🔍 Проверить товар")
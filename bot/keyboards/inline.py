@@ -1,7 +1,38 @@
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+import re
+from functools import lru_cache
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 
+class ProductCallback(CallbackData, prefix="p"):
+    """Действие над товаром: p:<action>:<product_id>"""
+    action: str
+    product_id: int
+
+
+# Кнопки из сообщений, отправленных до ProductCallback: <action>_<product_id>
+_LEGACY_CALLBACK_RE = re.compile(r"([a-z_]+)_(\d+)")
+
+
+def legacy_product_filter(actions):
+    """
+    Фильтр для старых кнопок: разбирает <action>_<product_id> в тот же
+    ProductCallback, чтобы уже отправленные сообщения продолжали работать.
+    """
+    def check(callback: CallbackQuery):
+        match = _LEGACY_CALLBACK_RE.fullmatch(callback.data or "")
+        if match and match.group(1) in actions:
+            return {"callback_data": ProductCallback(
+                action=match.group(1), product_id=int(match.group(2))
+            )}
+        return False
+    return check
+
+
+# Клавиатуры кешируются и переиспользуются между сообщениями — не мутировать!
+@lru_cache(maxsize=None)
 def main_menu_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -18,6 +49,7 @@ def main_menu_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def plans_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -32,64 +64,40 @@ def plans_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+# Раскладка кнопок товара по тарифам: (текст, action) — собирается один раз при импорте
+_BASE_ACTION_ROWS = (
+    (("📈 История цен", "history"), ("🚨 Фейк-скидка?", "fake")),
+)
+_PRO_ACTION_ROWS = (
+    (("🔔 Мониторить", "monitor"), ("🔍 Дешевле", "cheaper")),
+    (("🛡 Продавец", "seller"),),
+)
+_PREMIUM_ACTION_ROWS = (
+    (("🤖 AI-отзывы", "reviews"), ("📦 Аналоги", "analogs")),
+    (("📅 Прогноз цен", "predict"), ("💸 Кешбэк", "cashback")),
+)
+_PRODUCT_ACTION_ROWS = {
+    "FREE": _BASE_ACTION_ROWS,
+    "PRO": _BASE_ACTION_ROWS + _PRO_ACTION_ROWS,
+    "PREMIUM": _BASE_ACTION_ROWS + _PRO_ACTION_ROWS + _PREMIUM_ACTION_ROWS,
+}
+
+
+@lru_cache(maxsize=4096)
 def product_actions_kb(product_id: int, plan: str = "FREE") -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
-
-    builder.row(
-        InlineKeyboardButton(
-            text="📈 История цен",
-            callback_data=f"history_{product_id}"
-        ),
-        InlineKeyboardButton(
-            text="🚨 Фейк-скидка?",
-            callback_data=f"fake_{product_id}"
-        ),
-    )
-
-    if plan in ("PRO", "PREMIUM"):
-        builder.row(
+    rows = _PRODUCT_ACTION_ROWS.get(plan, _BASE_ACTION_ROWS)
+    keyboard = [
+        [
             InlineKeyboardButton(
-                text="🔔 Мониторить",
-                callback_data=f"monitor_{product_id}"
-            ),
-            InlineKeyboardButton(
-                text="🔍 Дешевле",
-                callback_data=f"cheaper_{product_id}"
-            ),
-        )
-        builder.row(
-            InlineKeyboardButton(
-                text="🛡 Продавец",
-                callback_data=f"seller_{product_id}"
-            ),
-        )
-
-    if plan == "PREMIUM":
-        builder.row(
-            InlineKeyboardButton(
-                text="🤖 AI-отзывы",
-                callback_data=f"reviews_{product_id}"
-            ),
-            InlineKeyboardButton(
-                text="📦 Аналоги",
-                callback_data=f"analogs_{product_id}"
-            ),
-        )
-        builder.row(
-            InlineKeyboardButton(
-                text="📅 Прогноз цен",
-                callback_data=f"predict_{product_id}"
-            ),
-            InlineKeyboardButton(
-                text="💸 Кешбэк",
-                callback_data=f"cashback_{product_id}"
-            ),
-        )
-
-    builder.row(
-        InlineKeyboardButton(text="◀️ Меню", callback_data="back_to_menu"),
-    )
-    return builder.as_markup()
+                text=text,
+                callback_data=ProductCallback(action=action, product_id=product_id).pack()
+            )
+            for text, action in row
+        ]
+        for row in rows
+    ]
+    keyboard.append([InlineKeyboardButton(text="◀️ Меню", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 def monitor_confirm_kb(product_id: int) -> InlineKeyboardMarkup:
@@ -97,17 +105,17 @@ def monitor_confirm_kb(product_id: int) -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(
             text="🔔 Уведомлять о ЛЮБОМ снижении",
-            callback_data=f"mon_any_{product_id}"
+            callback_data=ProductCallback(action="mon_any", product_id=product_id).pack()
         ),
     )
     builder.row(
         InlineKeyboardButton(
             text="🎯 Указать желаемую цену",
-            callback_data=f"mon_target_{product_id}"
+            callback_data=ProductCallback(action="mon_target", product_id=product_id).pack()
         ),
     )
     builder.row(
-        InlineKeyboardButton(text="◀️ Назад", callback_data=f"product_{product_id}"),
+        InlineKeyboardButton(text="◀️ Назад", callback_data=ProductCallback(action="product", product_id=product_id).pack()),
     )
     return builder.as_markup()
 
@@ -120,11 +128,11 @@ def monitors_list_kb(monitors: list) -> InlineKeyboardMarkup:
         builder.row(
             InlineKeyboardButton(
                 text=f"📦 {title}",
-                callback_data=f"product_{product.id}"
+                callback_data=ProductCallback(action="product", product_id=product.id).pack()
             ),
             InlineKeyboardButton(
                 text="❌",
-                callback_data=f"unmonitor_{product.id}"
+                callback_data=ProductCallback(action="unmonitor", product_id=product.id).pack()
             ),
         )
     builder.row(
@@ -150,6 +158,7 @@ def payment_kb(payment_url: str, payment_id: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def back_to_menu_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -158,6 +167,7 @@ def back_to_menu_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def upgrade_kb() -> InlineKeyboardMarkup:
     """Кнопка апгрейда для заблокированных функций"""
     builder = InlineKeyboardBuilder()
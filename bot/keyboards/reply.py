@@ -1,7 +1,10 @@
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
 
+@lru_cache(maxsize=None)
 def main_reply_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.row(
@@ -1,22 +1,28 @@
 import asyncio
 import logging
 import os
-import traceback
+import orjson
 from aiohttp import web
 
 from aiogram import Bot, Dispatcher, Router
 from aiogram.enums import ParseMode
 from aiogram.types import Update
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from config import config
 from database.db import get_db
 from bot.middlewares.throttling import ThrottlingMiddleware
+from bot.middlewares.chat_order import ChatOrderMiddleware
 
 logger = logging.getLogger(__name__)
 
 _scheduler_task = None
 
+# Long polling: сколько секунд Telegram держит getUpdates открытым
+POLLING_TIMEOUT = 30
+
 
 def setup_routers() -> Router:
     main_router = Router()
@@ -44,27 +50,41 @@ async def health_handler(request):
     return web.Response(text="OK")
 
 
-async def run_health_server():
-    """Мини HTTP-сервер — Railway не убьёт контейнер"""
-    port = int(os.getenv("PORT", "8080"))
+def create_web_app() -> web.Application:
     app = web.Application()
     app.router.add_get("/", health_handler)
     app.router.add_get("/health", health_handler)
-    runner = web.AppRunner(app)
+    return app
+
+
+async def run_health_server():
+    """Мини HTTP-сервер — Railway не убьёт контейнер"""
+    port = int(os.getenv("PORT", "8080"))
+    runner = web.AppRunner(create_web_app())
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
     logger.info(f"Health server started on port {port}")
 
 
-async def on_startup(bot: Bot):
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
     global _scheduler_task
 
     db = await get_db()
     logger.info("Database initialized")
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("Webhook deleted, polling mode")
+    if dispatcher.get("webhook_mode"):
+        await bot.set_webhook(
+            config.webhook.full_url,
+            secret_token=config.webhook.secret or None,
+            max_connections=config.webhook.max_connections,
+            allowed_updates=dispatcher["used_update_types"],
+            drop_pending_updates=True,
+        )
+        logger.info(f"Webhook set: {config.webhook.full_url}")
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
+        logger.info("Webhook deleted, polling mode")
 
     try:
         from bot.services.monitor_scheduler import run_scheduler
@@ -73,8 +93,11 @@ async def on_startup(bot: Bot):
     except Exception as e:
         logger.error(f"Scheduler failed: {e}")
 
-    me = await bot.get_me()
-    logger.info(f"Bot: @{me.username} (id={me.id})")
+    if config.bot.username:
+        logger.info(f"Bot: @{config.bot.username} (id={bot.id})")
+    else:
+        me = await bot.get_me()
+        logger.info(f"Bot: @{me.username} (id={me.id})")
     logger.info("PriceGhost Bot started!")
 
 
@@ -91,12 +114,28 @@ async def on_shutdown(bot: Bot):
         await db.close()
     except Exception:
         pass
+
+    from bot.services.yookassa_service import close_client
+    from bot.services.gigachat import close_gigachat
+    from bot.services.chart import shutdown_chart_pool
+    from bot.utils.http import close_session
+    await close_client()
+    await close_gigachat()
+    await close_session()
+    shutdown_chart_pool()
     logger.info("Bot stopped")
 
 
+def _json_dumps(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+
 def create_bot() -> Bot:
+    # orjson вместо stdlib json для всех запросов/ответов Bot API
+    session = AiohttpSession(json_loads=orjson.loads, json_dumps=_json_dumps)
     return Bot(
         token=config.bot.token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
 
@@ -104,22 +143,31 @@ def create_bot() -> Bot:
 def create_dispatcher() -> Dispatcher:
     dp = Dispatcher()
 
+    # Апдейты обрабатываются задачами параллельно; порядок сообщений — внутри чата
+    dp.message.outer_middleware(ChatOrderMiddleware())
     dp.message.middleware(ThrottlingMiddleware(rate_limit=0.5))
     dp.callback_query.middleware(ThrottlingMiddleware(rate_limit=0.3))
 
     main_router = setup_routers()
     dp.include_router(main_router)
 
+    # Telegram присылает только те типы апдейтов, на которые есть хендлеры
+    dp["used_update_types"] = dp.resolve_used_update_types()
+    logger.info(f"Allowed updates: {', '.join(dp['used_update_types'])}")
+
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
     @dp.update.outer_middleware()
     async def log_updates(handler, event: Update, data):
-        logger.info(f"UPDATE {event.update_id}: {event.event_type}")
+        # Строку апдейта форматируем только при включённом DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("UPDATE %s: %s", event.update_id, event.event_type)
         try:
             return await handler(event, data)
         except Exception as e:
-            logger.error(f"HANDLER ERROR: {e}\n{traceback.format_exc()}")
+            # Трейсбек форматирует сам logging и только если запись будет выведена
+            logger.exception("HANDLER ERROR: %s", e)
             raise
 
     return dp
@@ -131,6 +179,38 @@ async def start_polling():
 
     bot = create_bot()
     dp = create_dispatcher()
-    await bot.delete_webhook(drop_pending_updates=True)
+    # Вебхук снимается в on_startup; апдейты обрабатываются задачами параллельно
     logger.info("Starting polling...")
-    await dp.start_polling(bot)
+    await dp.start_polling(
+        bot,
+        polling_timeout=POLLING_TIMEOUT,
+        handle_as_tasks=True,
+        allowed_updates=dp["used_update_types"],
+    )
+
+
+async def start_webhook():
+    """Приём апдейтов через вебхук на том же aiohttp-сервере, что и health"""
+    bot = create_bot()
+    dp = create_dispatcher()
+    dp["webhook_mode"] = True
+
+    app = create_web_app()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.webhook.secret or None,
+    ).register(app, path=config.webhook.path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.webhook.host, config.webhook.port)
+    await site.start()
+    logger.info(f"Webhook server started on port {config.webhook.port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
@@ -0,0 +1,28 @@
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """
+    Апдейты aiogram обрабатывает параллельно (отдельными задачами),
+    поэтому сообщения одного чата могли бы обгонять друг друга.
+    Сериализует обработку внутри чата, разные чаты идут параллельно.
+    """
+
+    def __init__(self):
+        # Лок живёт, пока его держит или ждёт хотя бы один апдейт
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        lock = self._locks.setdefault(event.chat.id, asyncio.Lock())
+        async with lock:
+            return await handler(event, data)
@@ -1,16 +1,51 @@
+import time
+from collections import OrderedDict
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
-from datetime import datetime, timedelta
-import asyncio
+
+# Сколько последних пользователей помнить; старые вытесняются (LRU)
+THROTTLE_MAX_USERS = 100_000
+# Сколько быстрых запросов подряд пропускаем, прежде чем начать притормаживать
+THROTTLE_BURST = 3
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    """Защита от спама"""
+    """
+    Защита от спама: token bucket на пользователя.
+    Короткая серия из burst запросов проходит сразу, дальше —
+    не чаще одного запроса в rate_limit секунд.
+    """
 
-    def __init__(self, rate_limit: float = 0.5):
+    def __init__(
+        self,
+        rate_limit: float = 0.5,
+        burst: int = THROTTLE_BURST,
+        max_users: int = THROTTLE_MAX_USERS,
+    ):
         self.rate_limit = rate_limit
-        self.user_last_request: Dict[int, datetime] = {}
+        self.burst = burst
+        self.max_users = max_users
+        # user_id -> [оставшиеся токены, время последнего пополнения (time.monotonic)]
+        self.user_buckets: OrderedDict[int, list[float]] = OrderedDict()
+
+    def _allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        bucket = self.user_buckets.get(user_id)
+
+        if bucket is None:
+            bucket = self.user_buckets[user_id] = [float(self.burst), now]
+            if len(self.user_buckets) > self.max_users:
+                self.user_buckets.popitem(last=False)
+        else:
+            self.user_buckets.move_to_end(user_id)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) / self.rate_limit)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
 
     async def __call__(
         self,
@@ -20,13 +55,9 @@ class ThrottlingMiddleware(BaseMiddleware):
     ) -> Any:
         user_id = event.from_user.id if event.from_user else 0
 
-        now = datetime.utcnow()
-        last = self.user_last_request.get(user_id)
-
-        if last and (now - last).total_seconds() < self.rate_limit:
+        if not self._allow(user_id):
             if isinstance(event, CallbackQuery):
                 await event.answer("⏳ Подождите немного...", show_alert=False)
             return
 
-        self.user_last_request[user_id] = now
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
@@ -7,6 +7,12 @@ from bot.services.gigachat import get_gigachat
 
 logger = logging.getLogger(__name__)
 
+EXACT_LIMIT = 5
+ANALOG_LIMIT = 8
+
+# Одинаковый набор найденных товаров — одинаковая рекомендация
+AI_RECOMMENDATION_TTL = 3600
+
 
 async def find_analogs(
     title: str,
@@ -14,11 +20,14 @@ async def find_analogs(
     category: str,
     current_price: float,
     marketplace: str,
+    with_ai: bool = True,
 ) -> Dict[str, Any]:
     """
     Находит аналоги товара:
     1. Тот же товар у других продавцов
     2. Похожие товары других брендов дешевле
+    При with_ai=False AI-рекомендация не запрашивается —
+    её можно добавить позже через add_ai_recommendation.
     """
     result = {
         "same_product": [],
@@ -43,64 +52,41 @@ async def find_analogs(
     # Ищем на всех площадках
     all_marketplaces = ["wildberries", "ozon"]
 
-    # Параллельный поиск
-    exact_tasks = [
-        search_products(mp, exact_query, limit=5)
-        for mp in all_marketplaces
-    ]
-    analog_tasks = [
-        search_products(mp, analog_query, limit=8)
-        for mp in all_marketplaces
-    ]
-
-    all_tasks = exact_tasks + analog_tasks
-    all_results = await asyncio.gather(*all_tasks, return_exceptions=True)
+    # Параллельный поиск. Без бренда оба запроса совпадают — такие
+    # (площадка, запрос) ищем один раз с большим лимитом: выдача та же,
+    # точные результаты — её префикс
+    limits: Dict[tuple, int] = {}
+    for query, limit in ((exact_query, EXACT_LIMIT), (analog_query, ANALOG_LIMIT)):
+        for mp in all_marketplaces:
+            key = (mp, query)
+            limits[key] = max(limits.get(key, 0), limit)
+
+    search_results = await _run_searches(
+        limits,
+        exact_keys={(mp, exact_query) for mp in all_marketplaces},
+        analog_keys={(mp, analog_query) for mp in all_marketplaces},
+    )
 
-    exact_results = all_results[:len(exact_tasks)]
-    analog_results = all_results[len(exact_tasks):]
+    exact_results = [search_results.get((mp, exact_query), []) for mp in all_marketplaces]
+    analog_results = [search_results.get((mp, analog_query), []) for mp in all_marketplaces]
 
     # Обрабатываем точные результаты
     for mp, sr in zip(all_marketplaces, exact_results):
-        if isinstance(sr, Exception) or not isinstance(sr, list):
-            continue
-        for item in sr:
-            if item.get("price", 0) > 0:
-                saving = current_price - item["price"]
-                result["same_product"].append({
-                    "marketplace": mp,
-                    "title": item.get("title", ""),
-                    "price": item["price"],
-                    "saving": round(saving, 2),
-                    "saving_percent": round(
-                        saving / current_price * 100 if current_price > 0 else 0, 1
-                    ),
-                    "rating": item.get("rating", 0),
-                    "reviews_count": item.get("reviews_count", 0),
-                    "seller": item.get("seller", ""),
-                    "url": item.get("url", ""),
-                })
-
-    # Обрабатываем аналоги
-    for mp, sr in zip(all_marketplaces, analog_results):
-        if isinstance(sr, Exception) or not isinstance(sr, list):
-            continue
-        for item in sr:
+        for item in sr[:EXACT_LIMIT]:
             price = item.get("price", 0)
-            if price > 0 and price < current_price * 0.9:
-                # Только значительно дешевле
-                saving = current_price - price
-                result["cheaper_analogs"].append({
-                    "marketplace": mp,
-                    "title": item.get("title", ""),
-                    "price": price,
-                    "saving": round(saving, 2),
-                    "saving_percent": round(
-                        saving / current_price * 100 if current_price > 0 else 0, 1
-                    ),
-                    "rating": item.get("rating", 0),
-                    "reviews_count": item.get("reviews_count", 0),
-                    "url": item.get("url", ""),
-                })
+            if price > 0:
+                offer = _offer(mp, item, price, current_price)
+                offer["seller"] = item.get("seller", "")
+                result["same_product"].append(offer)
+
+    # Обрабатываем аналоги — только значительно дешевле
+    threshold = current_price * 0.9
+    for mp, sr in zip(all_marketplaces, analog_results):
+        result["cheaper_analogs"] += [
+            _offer(mp, item, price, current_price)
+            for item in sr
+            if 0 < (price := item.get("price", 0)) < threshold
+        ]
 
     # Сортируем по цене
     result["same_product"].sort(key=lambda x: x["price"])
@@ -110,7 +96,59 @@ async def find_analogs(
     result["same_product"] = result["same_product"][:5]
     result["cheaper_analogs"] = result["cheaper_analogs"][:5]
 
-    # AI-рекомендация
+    if with_ai:
+        await add_ai_recommendation(result, title, brand, current_price)
+
+    return result
+
+
+async def _search_safe(mp: str, query: str, limit: int) -> List[Dict[str, Any]]:
+    """Поиск, который не роняет соседние задачи: при ошибке — пустая выдача"""
+    try:
+        return await search_products(mp, query, limit=limit)
+    except Exception as e:
+        logger.error(f"Analog search error ({mp}): {e}")
+        return []
+
+
+async def _run_searches(
+    limits: Dict[tuple, int], exact_keys: set, analog_keys: set
+) -> Dict[tuple, List[Dict[str, Any]]]:
+    """
+    Параллельный поиск по (площадка, запрос).
+    Когда точных совпадений уже хватает, отстающие площадки,
+    нужные только для точного поиска, не ждём — отменяем.
+    """
+    results: Dict[tuple, List[Dict[str, Any]]] = {}
+    exact_hits = 0
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = {
+            tg.create_task(_search_safe(mp, query, limit)): (mp, query)
+            for (mp, query), limit in limits.items()
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = tasks[task]
+                results[key] = task.result()
+                if key in exact_keys:
+                    exact_hits += sum(
+                        1 for item in results[key][:EXACT_LIMIT] if item.get("price", 0) > 0
+                    )
+            if exact_hits >= EXACT_LIMIT and not any(tasks[t] in analog_keys for t in pending):
+                for task in pending:
+                    task.cancel()
+                break
+
+    return results
+
+
+async def add_ai_recommendation(
+    result: Dict[str, Any], title: str, brand: str, current_price: float
+) -> Dict[str, Any]:
+    """Дописывает в результат find_analogs AI-рекомендацию (если есть что сравнивать)"""
     if result["same_product"] or result["cheaper_analogs"]:
         ai_rec = await _ai_analog_recommendation(
             title, brand, current_price,
@@ -123,6 +161,23 @@ async def find_analogs(
     return result
 
 
+def _offer(mp: str, item: Dict[str, Any], price: float, current_price: float) -> Dict[str, Any]:
+    """Карточка найденного предложения с экономией относительно текущей цены"""
+    saving = current_price - price
+    return {
+        "marketplace": mp,
+        "title": item.get("title", ""),
+        "price": price,
+        "saving": round(saving, 2),
+        "saving_percent": round(
+            saving / current_price * 100 if current_price > 0 else 0, 1
+        ),
+        "rating": item.get("rating", 0),
+        "reviews_count": item.get("reviews_count", 0),
+        "url": item.get("url", ""),
+    }
+
+
 async def _ai_analog_recommendation(
     title: str,
     brand: str,
@@ -133,13 +188,12 @@ async def _ai_analog_recommendation(
     """AI рекомендация по аналогам"""
     gigachat = get_gigachat()
 
-    same_text = ""
-    for p in same_products:
-        same_text += f"- {p['title'][:50]}: {p['price']}₽ ({p['marketplace']})\n"
-
-    analog_text = ""
-    for a in analogs:
-        analog_text += f"- {a['title'][:50]}: {a['price']}₽ ({a['marketplace']})\n"
+    same_text = "".join(
+        f"- {p['title'][:50]}: {p['price']}₽ ({p['marketplace']})\n" for p in same_products
+    )
+    analog_text = "".join(
+        f"- {a['title'][:50]}: {a['price']}₽ ({a['marketplace']})\n" for a in analogs
+    )
 
     prompt = f"""Товар: "{title}" (бренд: {brand}), цена: {current_price}₽
 
@@ -158,23 +212,28 @@ async def _ai_analog_recommendation(
         system_prompt="Ты — эксперт по покупкам. Отвечай кратко и по делу, на русском.",
         temperature=0.4,
         max_tokens=300,
+        cache_ttl=AI_RECOMMENDATION_TTL,
     )
 
     return response
 
 
-def format_analogs_result(data: Dict[str, Any], current_price: float) -> str:
-    """Форматирует результат поиска аналогов"""
+def format_analogs_result(
+    data: Dict[str, Any], current_price: float, ai_pending: bool = False
+) -> str:
+    """Форматирует результат поиска аналогов (ai_pending — рекомендация ещё в работе)"""
     from bot.utils.helpers import format_price
     from bot.utils.url_parser import get_marketplace_emoji, get_marketplace_name
 
-    text = "📦 <b>Поиск аналогов</b>\n\n"
-    text += f"📌 Текущая цена: <b>{format_price(current_price)}</b>\n\n"
+    parts = [
+        "📦 <b>Поиск аналогов</b>\n\n",
+        f"📌 Текущая цена: <b>{format_price(current_price)}</b>\n\n",
+    ]
 
     # Тот же товар
     same = data.get("same_product", [])
     if same:
-        text += "🔄 <b>Тот же товар у других продавцов:</b>\n\n"
+        parts.append("🔄 <b>Тот же товар у других продавцов:</b>\n\n")
         for i, p in enumerate(same[:5], 1):
             emoji = get_marketplace_emoji(p["marketplace"])
             mp_name = get_marketplace_name(p["marketplace"])
@@ -186,46 +245,49 @@ def format_analogs_result(data: Dict[str, Any], current_price: float) -> str:
             elif p["saving"] < 0:
                 saving_str = f" (дороже на {format_price(abs(p['saving']))})"
 
-            text += f"{i}. {emoji} <b>{mp_name}</b>\n"
-            text += f"   📦 {p['title'][:55]}\n"
-            text += f"   💰 <b>{price_str}</b>{saving_str}\n"
+            parts.append(f"{i}. {emoji} <b>{mp_name}</b>\n")
+            parts.append(f"   📦 {p['title'][:55]}\n")
+            parts.append(f"   💰 <b>{price_str}</b>{saving_str}\n")
 
             if p.get("rating"):
-                text += f"   ⭐ {p['rating']}"
+                parts.append(f"   ⭐ {p['rating']}")
                 if p.get("reviews_count"):
-                    text += f" ({p['reviews_count']} отз.)"
-                text += "\n"
+                    parts.append(f" ({p['reviews_count']} отз.)")
+                parts.append("\n")
 
             if p.get("url"):
-                text += f"   🔗 {p['url']}\n"
+                parts.append(f"   🔗 {p['url']}\n")
 
-            text += "\n"
+            parts.append("\n")
     else:
-        text += "🔄 Тот же товар у других продавцов не найден.\n\n"
+        parts.append("🔄 Тот же товар у других продавцов не найден.\n\n")
 
     # Аналоги дешевле
     analogs = data.get("cheaper_analogs", [])
     if analogs:
-        text += "💡 <b>Похожие товары дешевле:</b>\n\n"
+        parts.append("💡 <b>Похожие товары дешевле:</b>\n\n")
         for i, a in enumerate(analogs[:5], 1):
             emoji = get_marketplace_emoji(a["marketplace"])
 
-            text += f"{i}. {emoji} {a['title'][:55]}\n"
-            text += f"   💰 <b>{format_price(a['price'])}</b>"
-            text += f" (дешевле на {a['saving_percent']:.0f}%)\n"
+            parts.append(f"{i}. {emoji} {a['title'][:55]}\n")
+            parts.append(f"   💰 <b>{format_price(a['price'])}</b>")
+            parts.append(f" (дешевле на {a['saving_percent']:.0f}%)\n")
 
             if a.get("rating"):
-                text += f"   ⭐ {a['rating']}\n"
+                parts.append(f"   ⭐ {a['rating']}\n")
 
             if a.get("url"):
-                text += f"   🔗 {a['url']}\n"
-            text += "\n"
+                parts.append(f"   🔗 {a['url']}\n")
+            parts.append("\n")
     else:
-        text += "💡 Значительно более дешёвые аналоги не найдены.\n\n"
+        parts.append("💡 Значительно более дешёвые аналоги не найдены.\n\n")
 
     # AI рекомендация
-    if data.get("ai_recommendation"):
-        text += f"{'─' * 25}\n\n"
-        text += f"🤖 <b>AI-рекомендация:</b>\n{data['ai_recommendation']}\n"
-
-    return text
\ No newline at end of file
+    if ai_pending:
+        parts.append(f"{'─' * 25}\n\n")
+        parts.append("🤖 <i>AI-рекомендация готовится...</i>\n")
+    elif data.get("ai_recommendation"):
+        parts.append(f"{'─' * 25}\n\n")
+        parts.append(f"🤖 <b>AI-рекомендация:</b>\n{data['ai_recommendation']}\n")
+
+    return "".join(parts)
\ No newline at end of file
@@ -7,6 +7,9 @@ from bot.services.gigachat import get_gigachat
 
 logger = logging.getLogger(__name__)
 
+# Советы по экономии для одного и того же товара и цены не меняются часами
+AI_TIPS_TTL = 3600
+
 # Известные кешбэк-сервисы и их ставки
 CASHBACK_SERVICES = {
     "wildberries": [
@@ -103,6 +106,19 @@ CASHBACK_SERVICES = {
     ],
 }
 
+_RATE_RE = re.compile(r"([\d.]+)")
+
+
+def _parse_rate(rate: str) -> float:
+    match = _RATE_RE.search(rate)
+    return float(match.group(1)) if match else 0
+
+
+# Ставки статичны — строку «до N%» разбираем один раз при импорте
+for _services in CASHBACK_SERVICES.values():
+    for _svc in _services:
+        _svc["max_rate"] = _parse_rate(_svc["rate"])
+
 # Известные промокоды (условно — в реальности нужен API)
 PROMO_HINTS = {
     "wildberries": [
@@ -129,6 +145,21 @@ PROMO_HINTS = {
 }
 
 
+_TYPE_EMOJI = {
+    "карта": "💳",
+    "бонусы": "🎁",
+    "кешбэк-сервис": "🔄",
+}
+
+
+def _promo_block(tips: List[str]) -> str:
+    return "🏷 <b>Советы по промокодам:</b>\n" + "".join(f"  • {tip}\n" for tip in tips) + "\n"
+
+
+# Блок промо-советов статичен для площадки — собираем HTML один раз
+_PROMO_BLOCKS = {mp: _promo_block(tips) for mp, tips in PROMO_HINTS.items()}
+
+
 async def get_cashback_info(
     marketplace: str,
     current_price: float,
@@ -137,6 +168,11 @@ async def get_cashback_info(
 ) -> Dict[str, Any]:
     """Агрегатор кешбэков и промокодов"""
 
+    # AI-советы запрашиваем сразу — статичные данные собираются, пока ждём ответ
+    ai_task = asyncio.create_task(
+        _ai_saving_tips(marketplace, title, category, current_price)
+    )
+
     result = {
         "cashback_options": [],
         "promo_tips": [],
@@ -144,14 +180,13 @@ async def get_cashback_info(
         "max_saving": 0,
         "final_price_estimate": current_price,
         "ai_tips": "",
+        "marketplace": marketplace,
     }
 
     # 1. Кешбэк-сервисы
     services = CASHBACK_SERVICES.get(marketplace, [])
     for svc in services:
-        rate_match = re.search(r"([\d.]+)", svc["rate"])
-        max_rate = float(rate_match.group(1)) if rate_match else 0
-        saving = round(current_price * max_rate / 100, 2)
+        saving = round(current_price * svc["max_rate"] / 100, 2)
 
         result["cashback_options"].append({
             "name": svc["name"],
@@ -174,9 +209,11 @@ async def get_cashback_info(
     result["promo_tips"] = PROMO_HINTS.get(marketplace, [])
 
     # 3. AI-советы по экономии
-    ai_tips = await _ai_saving_tips(
-        marketplace, title, category, current_price
-    )
+    try:
+        ai_tips = await ai_task
+    except Exception as e:
+        logger.error(f"AI saving tips error: {e}")
+        ai_tips = None
     if ai_tips:
         result["ai_tips"] = ai_tips
 
@@ -207,6 +244,7 @@ async def _ai_saving_tips(
         ),
         temperature=0.4,
         max_tokens=400,
+        cache_ttl=AI_TIPS_TTL,
     )
 
     return response
@@ -216,13 +254,15 @@ def format_cashback_info(data: Dict[str, Any], current_price: float) -> str:
     """Форматирует информацию о кешбэках"""
     from bot.utils.helpers import format_price
 
-    text = "💸 <b>Кешбэк и промокоды</b>\n\n"
-    text += f"📌 Цена товара: <b>{format_price(current_price)}</b>\n\n"
+    parts = [
+        "💸 <b>Кешбэк и промокоды</b>\n\n",
+        f"📌 Цена товара: <b>{format_price(current_price)}</b>\n\n",
+    ]
 
     # Кешбэк-сервисы
     options = data.get("cashback_options", [])
     if options:
-        text += "💳 <b>Доступные кешбэки:</b>\n\n"
+        parts.append("💳 <b>Доступные кешбэки:</b>\n\n")
 
         # Сортируем по экономии
         options_sorted = sorted(options, key=lambda x: x["max_saving"], reverse=True)
@@ -231,41 +271,35 @@ def format_cashback_info(data: Dict[str, Any], current_price: float) -> str:
             is_best = opt == data.get("best_cashback")
             star = " ⭐ ЛУЧШИЙ" if is_best else ""
 
-            type_emoji = {
-                "карта": "💳",
-                "бонусы": "🎁",
-                "кешбэк-сервис": "🔄",
-            }.get(opt["type"], "💰")
+            type_emoji = _TYPE_EMOJI.get(opt["type"], "💰")
 
-            text += f"{i}. {type_emoji} <b>{opt['name']}</b>{star}\n"
-            text += f"   Ставка: <b>{opt['rate']}</b>\n"
-            text += f"   Экономия: до <b>{format_price(opt['max_saving'])}</b>\n"
-            text += f"   ℹ️ {opt['details']}\n\n"
+            parts.append(f"{i}. {type_emoji} <b>{opt['name']}</b>{star}\n")
+            parts.append(f"   Ставка: <b>{opt['rate']}</b>\n")
+            parts.append(f"   Экономия: до <b>{format_price(opt['max_saving'])}</b>\n")
+            parts.append(f"   ℹ️ {opt['details']}\n\n")
 
         # Лучший вариант
         if data.get("best_cashback"):
             best = data["best_cashback"]
             final = data.get("final_price_estimate", current_price)
-            text += f"{'─' * 25}\n"
-            text += (
+            parts.append(f"{'─' * 25}\n")
+            parts.append(
                 f"💰 <b>Лучший вариант:</b> {best['name']} ({best['rate']})\n"
                 f"💵 Финальная цена: ~<b>{format_price(final)}</b>\n"
                 f"📉 Экономия: до <b>{format_price(data.get('max_saving', 0))}</b>\n\n"
             )
     else:
-        text += "💳 Информация о кешбэках для этой площадки не найдена.\n\n"
+        parts.append("💳 Информация о кешбэках для этой площадки не найдена.\n\n")
 
     # Промо-советы
     tips = data.get("promo_tips", [])
     if tips:
-        text += "🏷 <b>Советы по промокодам:</b>\n"
-        for tip in tips:
-            text += f"  • {tip}\n"
-        text += "\n"
+        block = _PROMO_BLOCKS.get(data.get("marketplace"))
+        parts.append(block if block is not None else _promo_block(tips))
 
     # AI-советы
     if data.get("ai_tips"):
-        text += f"{'─' * 25}\n\n"
-        text += f"🤖 <b>AI-советы по экономии:</b>\n{data['ai_tips']}\n"
+        parts.append(f"{'─' * 25}\n\n")
+        parts.append(f"🤖 <b>AI-советы по экономии:</b>\n{data['ai_tips']}\n")
 
-    return text
\ No newline at end of file
+    return "".join(parts)
\ No newline at end of file
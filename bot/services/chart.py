@@ -1,19 +1,62 @@
+import asyncio
+import hashlib
 import io
 import logging
+import multiprocessing
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 import numpy as np
 
 from database.models import PriceRecord
+from bot.utils.cache import TTLCache
+from config import config
 
 logger = logging.getLogger(__name__)
 
+# Готовые PNG по хешу входных данных: повторный запрос того же графика
+# не гоняет matplotlib. Новая цена меняет данные, а значит и ключ
+CHART_CACHE_SIZE = 256
+CHART_CACHE_TTL = 3600
+_chart_cache = TTLCache(maxsize=CHART_CACHE_SIZE, ttl=CHART_CACHE_TTL)
+
+# Рендер matplotlib — CPU-bound, держим его вне event loop
+_chart_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_chart_pool() -> ProcessPoolExecutor:
+    global _chart_pool
+    if _chart_pool is None:
+        # Не fork: в процессе уже живут потоки aiosqlite/aiohttp, и дочерний
+        # процесс может унаследовать захваченные ими блокировки
+        _chart_pool = ProcessPoolExecutor(
+            max_workers=config.chart.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _chart_pool
+
+
+def shutdown_chart_pool():
+    global _chart_pool
+    if _chart_pool is not None:
+        _chart_pool.shutdown(cancel_futures=True)
+        _chart_pool = None
+
+
+async def _render(fn, *args) -> bytes:
+    """Запускает синхронный рендер графика в пуле процессов"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_chart_pool(), fn, *args)
+
 # Стиль графика
 plt.rcParams.update({
     "figure.facecolor": "#1a1a2e",
@@ -29,6 +72,40 @@ plt.rcParams.update({
 })
 
 
+# Фигуры переиспользуются внутри процесса пула, а не создаются на каждый
+# график. Это Figure без pyplot: не копятся в его реестре, если рендер упал
+_figures: dict = {}
+_SUBPLOT_DEFAULTS = {
+    k: plt.rcParams[f"figure.subplot.{k}"]
+    for k in ("left", "right", "bottom", "top", "wspace", "hspace")
+}
+
+
+def _get_figure(kind: str, figsize: tuple):
+    """Очищенная (fig, ax) для графика kind, одна на процесс"""
+    pair = _figures.get(kind)
+    if pair is None:
+        fig = Figure(figsize=figsize)
+        pair = _figures[kind] = (fig, fig.subplots())
+    else:
+        fig, ax = pair
+        for text in list(fig.texts):
+            text.remove()
+        ax.clear()
+        # tight_layout/autofmt_xdate двигают поля — возвращаем дефолтные
+        fig.subplots_adjust(**_SUBPLOT_DEFAULTS)
+    return pair
+
+
+# Столбцы по месяцам: зелёный — дешёвый месяц, красный — дорогой
+_BAR_CMAP = LinearSegmentedColormap.from_list("priceghost", ["#00d288", "#e94560"])
+
+# Telegram всё равно ужимает фото до ~1280px по ширине: 12" * 110dpi хватает.
+# Быстрое сжатие PNG — графики из сплошных заливок почти не теряют в размере
+CHART_DPI = 110
+PNG_KWARGS = {"compress_level": 3, "optimize": False}
+
+
 def _price_formatter(x, pos):
     """Форматирование цены на оси Y"""
     if x >= 1000:
@@ -42,19 +119,59 @@ async def generate_price_chart(
     current_price: float = None,
     min_price: float = None,
     max_price: float = None,
-) -> io.BytesIO:
+) -> bytes:
     """
     Генерирует красивый график истории цен.
-    Возвращает BytesIO с PNG изображением.
+    Возвращает PNG в байтах.
     """
     if not records:
-        return _generate_empty_chart()
+        return await _render(_generate_empty_chart)
 
+    # В пул процессов передаём только простые данные, не ORM-объекты
     dates = [r.recorded_at for r in records]
     prices = [r.price for r in records]
     original_prices = [r.original_price for r in records if r.original_price]
 
-    fig, ax = plt.subplots(figsize=(12, 6))
+    key = _chart_key(dates, prices, original_prices, title, current_price, min_price, max_price)
+    png = _chart_cache.get(key)
+    if png is None:
+        png = await _render(
+            _render_price_chart,
+            dates, prices, original_prices,
+            title, current_price, min_price, max_price,
+        )
+        _chart_cache.set(key, png)
+    return png
+
+
+def _chart_key(
+    dates: List[datetime],
+    prices: List[float],
+    original_prices: List[float],
+    *params,
+) -> bytes:
+    """Хеш входных данных графика (ключ кеша PNG)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(struct.pack("<2I", len(dates), len(original_prices)))
+    h.update(struct.pack(f"<{len(dates)}d", *(d.timestamp() for d in dates)))
+    h.update(struct.pack(f"<{len(prices)}d", *prices))
+    h.update(struct.pack(f"<{len(original_prices)}d", *original_prices))
+    h.update(repr(params).encode())
+    return h.digest()
+
+
+def _render_price_chart(
+    dates: List[datetime],
+    prices: List[float],
+    original_prices: List[float],
+    title: str,
+    current_price: Optional[float],
+    min_price: Optional[float],
+    max_price: Optional[float],
+) -> bytes:
+    """Рисует график истории цен (выполняется в пуле процессов)"""
+    prices_arr = np.asarray(prices, dtype=np.float64)
+    fig, ax = _get_figure("price", (12, 6))
 
     # Основная линия цены
     ax.plot(
@@ -85,9 +202,9 @@ async def generate_price_chart(
 
     # Маркеры мин/макс
     if min_price is not None:
-        min_indices = [i for i, p in enumerate(prices) if p == min_price]
-        if min_indices:
-            idx = min_indices[0]
+        min_indices = np.flatnonzero(prices_arr == min_price)
+        if min_indices.size:
+            idx = int(min_indices[0])
             ax.scatter(
                 [dates[idx]], [prices[idx]],
                 color="#00ff88", s=100, zorder=10, marker="v"
@@ -105,9 +222,9 @@ async def generate_price_chart(
             )
 
     if max_price is not None:
-        max_indices = [i for i, p in enumerate(prices) if p == max_price]
-        if max_indices:
-            idx = max_indices[-1]
+        max_indices = np.flatnonzero(prices_arr == max_price)
+        if max_indices.size:
+            idx = int(max_indices[-1])
             ax.scatter(
                 [dates[idx]], [prices[idx]],
                 color="#e94560", s=100, zorder=10, marker="^"
@@ -136,7 +253,7 @@ async def generate_price_chart(
         )
 
     # Средняя цена
-    avg = sum(prices) / len(prices)
+    avg = float(prices_arr.mean())
     ax.axhline(
         y=avg,
         color="#888",
@@ -176,8 +293,8 @@ async def generate_price_chart(
     ax.set_xlim(min(dates), max(dates))
 
     # Добавляем padding по Y
-    y_min = min(prices) * 0.9
-    y_max = max(prices) * 1.1
+    y_min = float(prices_arr.min()) * 0.9
+    y_max = float(prices_arr.max()) * 1.1
     ax.set_ylim(y_min, y_max)
 
     # Watermark
@@ -188,20 +305,18 @@ async def generate_price_chart(
         style="italic",
     )
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Сохраняем в BytesIO
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=150, bbox_inches="tight")
-    buf.seek(0)
-    plt.close(fig)
+    fig.savefig(buf, format="png", dpi=CHART_DPI, bbox_inches="tight", pil_kwargs=PNG_KWARGS)
 
-    return buf
+    return buf.getvalue()
 
 
-def _generate_empty_chart() -> io.BytesIO:
+def _generate_empty_chart() -> bytes:
     """Пустой график если нет данных"""
-    fig, ax = plt.subplots(figsize=(10, 5))
+    fig, ax = _get_figure("empty", (10, 5))
     ax.text(
         0.5, 0.5,
         "📊 Недостаточно данных\nОтслеживание начато!",
@@ -215,53 +330,50 @@ def _generate_empty_chart() -> io.BytesIO:
     ax.set_yticks([])
     ax.set_title("👻 PriceGhost — История цен", fontsize=14, fontweight="bold")
 
-    plt.tight_layout()
+    fig.tight_layout()
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=150)
-    buf.seek(0)
-    plt.close(fig)
-    return buf
+    fig.savefig(buf, format="png", dpi=CHART_DPI, pil_kwargs=PNG_KWARGS)
+    return buf.getvalue()
 
 
 async def generate_monthly_chart(
     monthly_data: dict,
     title: str = "Средние цены по месяцам"
-) -> io.BytesIO:
+) -> bytes:
     """Генерирует столбчатый график средних цен по месяцам (для прогноза)"""
+    return await _render(_render_monthly_chart, monthly_data, title)
+
+
+def _render_monthly_chart(monthly_data: dict, title: str) -> bytes:
+    """Рисует столбчатый график по месяцам (выполняется в пуле процессов)"""
 
     months_names = [
         "Янв", "Фев", "Мар", "Апр", "Май", "Июн",
         "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"
     ]
 
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig, ax = _get_figure("monthly", (12, 6))
 
     months = sorted(monthly_data.keys())
     values = [monthly_data[m] for m in months]
     labels = [months_names[m - 1] for m in months]
 
+    vals = np.asarray(values, dtype=np.float64)
+
     # Цвета: зеленый для дешёвых, красный для дорогих
     if values:
-        min_val = min(values)
-        max_val = max(values)
-        range_val = max_val - min_val if max_val > min_val else 1
-        colors = []
-        for v in values:
-            ratio = (v - min_val) / range_val
-            r = int(ratio * 233 + (1 - ratio) * 0)
-            g = int((1 - ratio) * 210 + ratio * 69)
-            b = int((1 - ratio) * 136 + ratio * 96)
-            colors.append(f"#{r:02x}{g:02x}{b:02x}")
+        colors = _BAR_CMAP((vals - vals.min()) / (np.ptp(vals) or 1))
     else:
         colors = ["#00d2ff"]
 
     bars = ax.bar(labels, values, color=colors, edgecolor="#333", linewidth=0.5)
 
     # Значения над столбцами
+    label_offset = vals.max() * 0.02 if values else 0
     for bar, val in zip(bars, values):
         ax.text(
             bar.get_x() + bar.get_width() / 2,
-            bar.get_height() + (max(values) * 0.02),
+            bar.get_height() + label_offset,
             f"{val:,.0f}₽",
             ha="center", va="bottom",
             fontsize=9, color="#ddd",
@@ -269,7 +381,7 @@ async def generate_monthly_chart(
 
     # Лучший месяц
     if values:
-        best_idx = values.index(min(values))
+        best_idx = int(vals.argmin())
         bars[best_idx].set_edgecolor("#00ff88")
         bars[best_idx].set_linewidth(3)
 
@@ -278,9 +390,7 @@ async def generate_monthly_chart(
     ax.yaxis.set_major_formatter(FuncFormatter(_price_formatter))
     ax.grid(axis="y", alpha=0.2)
 
-    plt.tight_layout()
+    fig.tight_layout()
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=150, bbox_inches="tight")
-    buf.seek(0)
-    plt.close(fig)
-    return buf
\ No newline at end of file
+    fig.savefig(buf, format="png", dpi=CHART_DPI, bbox_inches="tight", pil_kwargs=PNG_KWARGS)
+    return buf.getvalue()
\ No newline at end of file
@@ -1,4 +1,5 @@
 import logging
+from bisect import bisect_left
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
@@ -6,6 +7,9 @@ from database.db import get_db
 
 logger = logging.getLogger(__name__)
 
+# За сколько дней искать подъём цены перед «скидкой»
+MARKUP_LOOKBACK_DAYS = 60
+
 
 async def analyze_fake_discount(
     product_id: int,
@@ -18,7 +22,9 @@ async def analyze_fake_discount(
     Ищет паттерн: подъём цены -> "скидка" -> цена примерно как раньше.
     """
     db = await get_db()
-    records = await db.get_price_history(product_id, days=180)
+    records_count, history_min, history_max, history_avg = await db.get_price_stats(
+        product_id, days=180
+    )
 
     result = {
         "is_fake": False,
@@ -35,20 +41,14 @@ async def analyze_fake_discount(
         "history_max": None,
     }
 
-    if not records or len(records) < 2:
+    if records_count < 2:
         result["verdict"] = "📊 Недостаточно данных для анализа. Мы начали отслеживать этот товар."
         return result
 
-    prices = [r.price for r in records if r.price > 0]
-
-    if not prices:
+    if history_min is None:
         result["verdict"] = "📊 Нет данных о ценах."
         return result
 
-    history_min = min(prices)
-    history_max = max(prices)
-    history_avg = sum(prices) / len(prices)
-
     result["history_min"] = history_min
     result["history_avg"] = round(history_avg, 2)
     result["history_max"] = history_max
@@ -78,7 +78,10 @@ async def analyze_fake_discount(
             result["confidence"] = 85
 
             # Ищем подъём цены перед "скидкой"
-            markup_detected = _detect_price_markup(records)
+            markup_detected = _detect_price_markup(
+                await db.get_recent_prices(product_id, days=MARKUP_LOOKBACK_DAYS),
+                lookback_days=MARKUP_LOOKBACK_DAYS,
+            )
             if markup_detected:
                 result["confidence"] = 95
                 result["fake_markup"] = markup_detected["markup_percent"]
@@ -170,7 +173,7 @@ async def analyze_fake_discount(
 
 
 def _detect_price_markup(
-    records: list, lookback_days: int = 60
+    records: list, lookback_days: int = MARKUP_LOOKBACK_DAYS
 ) -> Optional[Dict]:
     """
     Ищет резкий подъём цены перед текущей «скидкой».
@@ -178,8 +181,9 @@ def _detect_price_markup(
     if len(records) < 3:
         return None
 
+    # Записи отсортированы по recorded_at
     cutoff = datetime.utcnow() - timedelta(days=lookback_days)
-    recent = [r for r in records if r.recorded_at >= cutoff]
+    recent = records[bisect_left(records, cutoff, key=lambda r: r.recorded_at):]
 
     if len(recent) < 3:
         return None
@@ -188,24 +192,20 @@ def _detect_price_markup(
     if len(prices) < 3:
         return None
 
-    # Ищем максимальный подъём
-    max_rise = 0
-    from_price = 0
-    to_price = 0
+    # numpy грузим только здесь: модуль импортируется роутером при старте
+    import numpy as np
 
-    for i in range(1, len(prices)):
-        if prices[i - 1] > 0:
-            rise = (prices[i] - prices[i - 1]) / prices[i - 1] * 100
-            if rise > max_rise:
-                max_rise = rise
-                from_price = prices[i - 1]
-                to_price = prices[i]
+    # Ищем максимальный подъём (первый, если их несколько)
+    p = np.asarray(prices, dtype=np.float64)
+    rises = (p[1:] - p[:-1]) / p[:-1] * 100
+    i = int(rises.argmax())
+    max_rise = float(rises[i])
 
     if max_rise > 15:  # Подъём больше 15%
         return {
             "markup_percent": max_rise,
-            "from_price": from_price,
-            "to_price": to_price,
+            "from_price": prices[i],
+            "to_price": prices[i + 1],
         }
 
     return None
\ No newline at end of file
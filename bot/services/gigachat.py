@@ -8,9 +8,16 @@ import aiohttp
 import certifi
 
 from config import config
+from bot.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Ответы на одинаковые запросы (ask(..., cache_ttl=...)) берутся из памяти
+_answers = TTLCache(maxsize=4096, ttl=3600)
+
+TOKEN_TIMEOUT = aiohttp.ClientTimeout(total=15)
+ASK_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
 
 class GigaChatAPI:
     """Клиент GigaChat API от Сбера"""
@@ -23,6 +30,28 @@ class GigaChatAPI:
         self._access_token: Optional[str] = None
         self._token_expires: float = 0
 
+        # Контекст собирается один раз (чтение CA-бандла с диска),
+        # проверка сертификата отключена, как и раньше
+        self._ssl_ctx = ssl.create_default_context(cafile=certifi.where())
+        self._ssl_ctx.check_hostname = False
+        self._ssl_ctx.verify_mode = ssl.CERT_NONE
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Долгоживущая сессия: keep-alive вместо TCP+TLS на каждый запрос"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    ssl=self._ssl_ctx, limit=20, keepalive_timeout=120,
+                ),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
     async def _get_token(self) -> Optional[str]:
         """Получает / обновляет access token"""
         now = time.time()
@@ -37,30 +66,23 @@ class GigaChatAPI:
         }
         data = {"scope": self.scope}
 
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-
-        timeout = aiohttp.ClientTimeout(total=15)
-
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    self.token_url,
-                    headers=headers,
-                    data=data,
-                    ssl=ssl_context,
-                ) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        self._access_token = result.get("access_token")
-                        self._token_expires = result.get("expires_at", now + 1800) / 1000
-                        logger.info("✅ GigaChat token obtained")
-                        return self._access_token
-                    else:
-                        error_text = await resp.text()
-                        logger.error(f"GigaChat token error {resp.status}: {error_text}")
-                        return None
+            async with self._get_session().post(
+                self.token_url,
+                headers=headers,
+                data=data,
+                timeout=TOKEN_TIMEOUT,
+            ) as resp:
+                if resp.status == 200:
+                    result = await resp.json()
+                    self._access_token = result.get("access_token")
+                    self._token_expires = result.get("expires_at", now + 1800) / 1000
+                    logger.info("✅ GigaChat token obtained")
+                    return self._access_token
+                else:
+                    error_text = await resp.text()
+                    logger.error(f"GigaChat token error {resp.status}: {error_text}")
+                    return None
         except Exception as e:
             logger.error(f"GigaChat token request failed: {e}")
             return None
@@ -71,8 +93,21 @@ class GigaChatAPI:
         system_prompt: str = "",
         temperature: float = 0.3,
         max_tokens: int = 1500,
+        cache_ttl: float = 0,
     ) -> Optional[str]:
-        """Отправляет запрос к GigaChat и возвращает ответ"""
+        """
+        Отправляет запрос к GigaChat и возвращает ответ.
+        При cache_ttl > 0 успешный ответ кешируется по тексту запроса.
+        """
+        if cache_ttl:
+            key = (system_prompt, prompt, temperature, max_tokens)
+            answer = _answers.get(key)
+            if answer is None:
+                answer = await self.ask(prompt, system_prompt, temperature, max_tokens)
+                if answer:
+                    _answers.set(key, answer, ttl=cache_ttl)
+            return answer
+
         token = await self._get_token()
         if not token:
             return None
@@ -96,33 +131,26 @@ class GigaChatAPI:
             "Authorization": f"Bearer {token}",
         }
 
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-
-        timeout = aiohttp.ClientTimeout(total=30)
-
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    f"{self.api_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    ssl=ssl_context,
-                ) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        choices = result.get("choices", [])
-                        if choices:
-                            return choices[0].get("message", {}).get("content", "")
-                        return None
-                    else:
-                        error_text = await resp.text()
-                        logger.error(f"GigaChat API error {resp.status}: {error_text}")
-                        # Сброс токена при 401
-                        if resp.status == 401:
-                            self._access_token = None
-                        return None
+            async with self._get_session().post(
+                f"{self.api_url}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=ASK_TIMEOUT,
+            ) as resp:
+                if resp.status == 200:
+                    result = await resp.json()
+                    choices = result.get("choices", [])
+                    if choices:
+                        return choices[0].get("message", {}).get("content", "")
+                    return None
+                else:
+                    error_text = await resp.text()
+                    logger.error(f"GigaChat API error {resp.status}: {error_text}")
+                    # Сброс токена при 401
+                    if resp.status == 401:
+                        self._access_token = None
+                    return None
         except Exception as e:
             logger.error(f"GigaChat request failed: {e}")
             return None
@@ -136,4 +164,9 @@ def get_gigachat() -> GigaChatAPI:
     global _gigachat
     if _gigachat is None:
         _gigachat = GigaChatAPI()
-    return _gigachat
\ No newline at end of file
+    return _gigachat
+
+
+async def close_gigachat():
+    if _gigachat is not None:
+        await _gigachat.close()
\ No newline at end of file
@@ -1,12 +1,14 @@
 import asyncio
 import logging
 from datetime import datetime
+from functools import partial
 
 from aiogram import Bot
 
 from database.db import get_db
 from bot.services.scraper import scrape_product
 from bot.utils.helpers import format_price
+from bot.utils.ratelimit import tg_limiter
 from bot.utils.url_parser import get_marketplace_emoji
 
 logger = logging.getLogger(__name__)
@@ -127,11 +129,15 @@ async def check_monitored_prices(bot: Bot):
 
         if should_notify and notification_text:
             try:
-                await bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=notification_text,
-                    parse_mode="HTML",
-                    disable_web_page_preview=True,
+                await tg_limiter.send(
+                    user.telegram_id,
+                    partial(
+                        bot.send_message,
+                        chat_id=user.telegram_id,
+                        text=notification_text,
+                        parse_mode="HTML",
+                        disable_web_page_preview=True,
+                    ),
                 )
                 await db.update_monitor_notified(monitor.id, new_price)
                 logger.info(
@@ -3,17 +3,21 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 
 from database.db import get_db
+from database.models import PriceRecord
 from bot.services.scraper import scrape_product
 
 logger = logging.getLogger(__name__)
 
 
 async def fetch_and_save_price(
-    marketplace: str, product_id: str, url: str
+    marketplace: str, product_id: str, url: str,
+    stats_days: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     Скрапит товар, сохраняет/обновляет в БД, записывает цену.
     Возвращает dict с инфой о товаре.
+    При stats_days в product_data["stats"] кладётся статистика за этот период,
+    посчитанная в той же транзакции, что и запись цены.
     """
     db = await get_db()
 
@@ -30,34 +34,32 @@ async def fetch_and_save_price(
         external_id=product_id,
     )
 
-    # Обновляем данные товара
-    await db.update_product(
+    # Обновляем данные товара и записываем цену
+    records = await db.save_price_snapshot(
         db_product.id,
-        title=product_data.get("title"),
-        brand=product_data.get("brand"),
-        category=product_data.get("category"),
-        image_url=product_data.get("image_url"),
-        seller_name=product_data.get("seller_name"),
-        seller_id=product_data.get("seller_id"),
-        current_price=product_data.get("current_price"),
+        fields=dict(
+            title=product_data.get("title"),
+            brand=product_data.get("brand"),
+            category=product_data.get("category"),
+            image_url=product_data.get("image_url"),
+            seller_name=product_data.get("seller_name"),
+            seller_id=product_data.get("seller_id"),
+            current_price=product_data.get("current_price"),
+            original_price=product_data.get("original_price"),
+            rating=product_data.get("rating"),
+            reviews_count=product_data.get("reviews_count"),
+            updated_at=datetime.utcnow(),
+        ),
+        price=product_data.get("current_price", 0),
         original_price=product_data.get("original_price"),
-        rating=product_data.get("rating"),
-        reviews_count=product_data.get("reviews_count"),
-        updated_at=datetime.utcnow(),
+        discount_percent=product_data.get("discount_percent"),
+        history_days=stats_days,
     )
 
-    # Записываем цену
-    current_price = product_data.get("current_price", 0)
-    if current_price > 0:
-        await db.add_price_record(
-            product_id=db_product.id,
-            price=current_price,
-            original_price=product_data.get("original_price"),
-            discount_percent=product_data.get("discount_percent"),
-        )
-
     # Добавляем ID из базы
     product_data["db_id"] = db_product.id
+    if stats_days is not None:
+        product_data["stats"] = compute_price_stats(records)
 
     return product_data
 
@@ -68,14 +70,42 @@ async def get_price_stats(product_id: int, days: int = 365) -> Dict[str, Any]:
     """
     db = await get_db()
     records = await db.get_price_history(product_id, days)
+    return compute_price_stats(records)
 
+
+def compute_price_stats(records: List[PriceRecord]) -> Dict[str, Any]:
+    """Считает статистику по уже загруженным записям истории"""
     if not records:
         return {
             "has_data": False,
             "records_count": 0,
         }
 
-    prices = [r.price for r in records if r.price > 0]
+    # Один проход по записям: мин/макс/сумма и первая/последняя цена за 30 дней
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    prices = []
+    min_record = max_record = None
+    total = 0.0
+    first_recent = last_recent = None
+    recent_count = 0
+
+    for r in records:
+        price = r.price
+        if price <= 0:
+            continue
+
+        prices.append(price)
+        total += price
+        if min_record is None or price < min_record.price:
+            min_record = r
+        if max_record is None or price > max_record.price:
+            max_record = r
+
+        if r.recorded_at >= thirty_days_ago:
+            if first_recent is None:
+                first_recent = price
+            last_recent = price
+            recent_count += 1
 
     if not prices:
         return {
@@ -84,30 +114,19 @@ async def get_price_stats(product_id: int, days: int = 365) -> Dict[str, Any]:
         }
 
     current_price = prices[-1]
-    min_price = min(prices)
-    max_price = max(prices)
-    avg_price = sum(prices) / len(prices)
+    min_price = min_record.price
+    max_price = max_record.price
+    avg_price = total / len(prices)
 
     # Тренд за последние 30 дней
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_records = [r for r in records if r.recorded_at >= thirty_days_ago]
-    recent_prices = [r.price for r in recent_records if r.price > 0]
-
     trend = "stable"
     trend_percent = 0
-    if len(recent_prices) >= 2:
-        first_recent = recent_prices[0]
-        last_recent = recent_prices[-1]
-        if first_recent > 0:
-            trend_percent = ((last_recent - first_recent) / first_recent) * 100
-            if trend_percent > 3:
-                trend = "up"
-            elif trend_percent < -3:
-                trend = "down"
-
-    # Когда была мин. и макс. цена
-    min_record = min(records, key=lambda r: r.price if r.price > 0 else float('inf'))
-    max_record = max(records, key=lambda r: r.price)
+    if recent_count >= 2:
+        trend_percent = ((last_recent - first_recent) / first_recent) * 100
+        if trend_percent > 3:
+            trend = "up"
+        elif trend_percent < -3:
+            trend = "down"
 
     return {
         "has_data": True,
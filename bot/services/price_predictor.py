@@ -4,7 +4,6 @@ from datetime import datetime
 
 from bot.services.price_history import get_monthly_avg_prices, get_price_stats
 from bot.services.gigachat import get_gigachat
-from bot.services.chart import generate_monthly_chart
 
 logger = logging.getLogger(__name__)
 
@@ -125,8 +124,9 @@ async def predict_price(
                 ((current_price - avg) / avg) * 100, 1
             )
 
-        # Генерируем график
+        # Генерируем график (matplotlib грузим лениво)
         try:
+            from bot.services.chart import generate_monthly_chart
             chart = await generate_monthly_chart(
                 monthly, title=f"Средние цены: {title[:40]}"
             )
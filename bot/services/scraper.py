@@ -2,16 +2,18 @@ import re
 import json
 import asyncio
 import logging
-import ssl
 from typing import Optional, Dict, Any
 
 import aiohttp
-import certifi
 from bs4 import BeautifulSoup
 
+from bot.utils.http import get_session
+
 logger = logging.getLogger(__name__)
 
 
+FETCH_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
 OZON_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Linux; Android 10; SM-G975F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Mobile Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -31,8 +33,8 @@ async def _ozon_fetch(url: str) -> Optional[str]:
     """Специальный fetch для Ozon с обходом блокировки"""
     logger.info(f"OZON FETCH: {url[:100]}")
     try:
-        ssl_ctx = ssl.create_default_context(cafile=certifi.where())
-        
+        session = get_session()
+
         # Пробуем разные User-Agent
         agents = [
             "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Mobile Safari/537.36",
@@ -42,18 +44,14 @@ async def _ozon_fetch(url: str) -> Optional[str]:
         
         for ua in agents:
             headers = {**OZON_HEADERS, "User-Agent": ua}
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=15),
-                headers=headers,
-            ) as session:
-                async with session.get(url, ssl=ssl_ctx) as resp:
-                    logger.info(f"  OZON -> {resp.status} (UA: {ua[:30]})")
-                    if resp.status == 200:
-                        return await resp.text()
-                    elif resp.status == 403:
-                        continue
-                    else:
-                        return None
+            async with session.get(url, headers=headers, timeout=FETCH_TIMEOUT) as resp:
+                logger.info(f"  OZON -> {resp.status} (UA: {ua[:30]})")
+                if resp.status == 200:
+                    return await resp.text()
+                elif resp.status == 403:
+                    continue
+                else:
+                    return None
         
         logger.warning("OZON: all User-Agents blocked")
         return None
@@ -62,32 +60,23 @@ async def _ozon_fetch(url: str) -> Optional[str]:
         return None
 
 
-def _get_ssl():
-    return ssl.create_default_context(cafile=certifi.where())
-
-
-def _headers():
-    return {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/131.0.0.0 Safari/537.36",
-        "Accept": "*/*",
-        "Accept-Language": "ru-RU,ru;q=0.9",
-        "Origin": "https://www.wildberries.ru",
-        "Referer": "https://www.wildberries.ru/",
-    }
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/131.0.0.0 Safari/537.36",
+    "Accept": "*/*",
+    "Accept-Language": "ru-RU,ru;q=0.9",
+    "Origin": "https://www.wildberries.ru",
+    "Referer": "https://www.wildberries.ru/",
+}
 
 
 async def _fetch(url: str) -> Optional[str]:
     logger.info(f"FETCH: {url[:120]}")
     try:
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=15),
-            headers=_headers(),
-        ) as s:
-            async with s.get(url, ssl=_get_ssl()) as r:
-                logger.info(f"  -> {r.status}")
-                if r.status == 200:
-                    return await r.text()
-                return None
+        async with get_session().get(url, headers=FETCH_HEADERS, timeout=FETCH_TIMEOUT) as r:
+            logger.info(f"  -> {r.status}")
+            if r.status == 200:
+                return await r.text()
+            return None
     except Exception as e:
         logger.error(f"  -> ERROR: {e}")
         return None
@@ -548,10 +537,22 @@ async def scrape_product(marketplace: str, product_id: str) -> Optional[Dict[str
     return result
 
 
+# Одинаковые поиски, запущенные одновременно (аналоги/дешевле у разных
+# пользователей на один товар), ждут один общий запрос к площадке
+_search_inflight: Dict[tuple, asyncio.Task] = {}
+
+
 async def search_products(marketplace: str, query: str, limit: int = 10) -> list:
-    if marketplace == "wildberries":
-        return await _wb_search(query, limit)
-    return []
+    if marketplace != "wildberries":
+        return []
+
+    key = (marketplace, query, limit)
+    task = _search_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_wb_search(query, limit))
+        _search_inflight[key] = task
+        task.add_done_callback(lambda _: _search_inflight.pop(key, None))
+    return await asyncio.shield(task)
 
 
 async def scrape_reviews(marketplace: str, product_id: str, limit: int = 100) -> list:
@@ -5,6 +5,9 @@ from bot.services.scraper import scrape_seller
 
 logger = logging.getLogger(__name__)
 
+# Шкала доверия 0..100 с шагом 10
+_TRUST_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
 
 async def check_seller(
     marketplace: str,
@@ -124,50 +127,48 @@ def format_seller_check(data: Dict[str, Any]) -> str:
         trust_label = "Ненадёжный"
 
     # Прогресс-бар
-    filled = int(score / 10)
-    bar = "█" * filled + "░" * (10 - filled)
-
-    text = f"🛡 <b>Проверка продавца</b>\n\n"
-    text += f"{emoji} Площадка: <b>{mp_name}</b>\n"
-    text += f"🏪 Продавец: <b>{data['name'] or 'Неизвестен'}</b>\n"
-    text += f"🆔 ID: <code>{data['id'] or 'N/A'}</code>\n\n"
+    bar = _TRUST_BARS[max(0, min(10, int(score / 10)))]
 
-    text += f"{trust_emoji} Доверие: <b>{trust_label}</b> ({score}/100)\n"
-    text += f"[{bar}]\n\n"
+    parts = [
+        "🛡 <b>Проверка продавца</b>\n\n",
+        f"{emoji} Площадка: <b>{mp_name}</b>\n",
+        f"🏪 Продавец: <b>{data['name'] or 'Неизвестен'}</b>\n",
+        f"🆔 ID: <code>{data['id'] or 'N/A'}</code>\n\n",
+        f"{trust_emoji} Доверие: <b>{trust_label}</b> ({score}/100)\n",
+        f"[{bar}]\n\n",
+    ]
 
     # Детали юр. лица
     details = data.get("details", {})
     if details.get("inn"):
-        text += f"📋 ИНН: <code>{details['inn']}</code>\n"
+        parts.append(f"📋 ИНН: <code>{details['inn']}</code>\n")
     if details.get("ogrn"):
-        text += f"📋 ОГРН: <code>{details['ogrn']}</code>\n"
+        parts.append(f"📋 ОГРН: <code>{details['ogrn']}</code>\n")
     if details.get("trade_mark"):
-        text += f"™ Торговая марка: {details['trade_mark']}\n"
+        parts.append(f"™ Торговая марка: {details['trade_mark']}\n")
     if details.get("total_products"):
-        text += f"📦 Товаров: {details['total_products']}\n"
+        parts.append(f"📦 Товаров: {details['total_products']}\n")
     if details.get("legal_address"):
-        text += f"📍 {details['legal_address'][:80]}\n"
+        parts.append(f"📍 {details['legal_address'][:80]}\n")
 
-    text += "\n"
+    parts.append("\n")
 
     if data["positive"]:
-        text += "<b>Плюсы:</b>\n"
-        for p in data["positive"]:
-            text += f"  {p}\n"
-        text += "\n"
+        parts.append("<b>Плюсы:</b>\n")
+        parts += [f"  {p}\n" for p in data["positive"]]
+        parts.append("\n")
 
     if data["warnings"]:
-        text += "<b>Предупреждения:</b>\n"
-        for w in data["warnings"]:
-            text += f"  {w}\n"
-        text += "\n"
+        parts.append("<b>Предупреждения:</b>\n")
+        parts += [f"  {w}\n" for w in data["warnings"]]
+        parts.append("\n")
 
     # Итоговая рекомендация
     if score >= 75:
-        text += "💚 <b>Рекомендация:</b> Можно покупать с уверенностью."
+        parts.append("💚 <b>Рекомендация:</b> Можно покупать с уверенностью.")
     elif score >= 50:
-        text += "💛 <b>Рекомендация:</b> Обратите внимание на отзывы."
+        parts.append("💛 <b>Рекомендация:</b> Обратите внимание на отзывы.")
     else:
-        text += "❤️ <b>Рекомендация:</b> Будьте осторожны, проверьте отзывы тщательно."
+        parts.append("❤️ <b>Рекомендация:</b> Будьте осторожны, проверьте отзывы тщательно.")
 
-    return text
\ No newline at end of file
+    return "".join(parts)
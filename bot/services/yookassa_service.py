@@ -1,11 +1,45 @@
+import asyncio
+import logging
 import uuid
-from typing import Optional, Tuple
-from yookassa import Configuration, Payment as YKPayment
+from typing import Dict, Optional, Tuple
+
+import httpx
+
 from config import config
+from bot.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+YOOKASSA_API_URL = "https://api.yookassa.ru/v3"
+
+# Один долгоживущий клиент: TLS-соединение к ЮKassa переиспользуется между платежами
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=YOOKASSA_API_URL,
+            auth=(config.yookassa.shop_id, config.yookassa.secret_key),
+            http2=True,
+            timeout=10,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _client
+
 
-# Init YooKassa
-Configuration.account_id = config.yookassa.shop_id
-Configuration.secret_key = config.yookassa.secret_key
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# Пользователи жмут «Проверить оплату» по нескольку раз подряд —
+# схлопываем такие нажатия в один запрос к ЮKassa
+PAYMENT_STATUS_TTL = 3
+_status_cache = TTLCache(maxsize=1024, ttl=PAYMENT_STATUS_TTL)
+_status_inflight: Dict[str, asyncio.Task] = {}
 
 PLAN_PRICES = {
     "PRO": {
@@ -33,8 +67,10 @@ async def create_payment(
     idempotence_key = str(uuid.uuid4())
 
     try:
-        payment = YKPayment.create(
-            {
+        response = await _get_client().post(
+            "/payments",
+            headers={"Idempotence-Key": idempotence_key},
+            json={
                 "amount": {
                     "value": plan_info["amount"],
                     "currency": "RUB",
@@ -50,19 +86,39 @@ async def create_payment(
                     "plan": plan,
                 },
             },
-            idempotence_key,
         )
-        return payment.id, payment.confirmation.confirmation_url
+        response.raise_for_status()
+        payment = response.json()
+        return payment["id"], payment["confirmation"]["confirmation_url"]
     except Exception as e:
-        print(f"YooKassa error: {e}")
+        logger.error(f"YooKassa error: {e}")
         return None, None
 
 
 async def check_payment_status(payment_id: str) -> Optional[str]:
-    """Проверяет статус платежа. Returns: status string"""
+    """Проверяет статус платежа (с коротким кешем). Returns: status string"""
+    status = _status_cache.get(payment_id)
+    if status is not None:
+        return status
+
+    # Одновременные нажатия ждут один и тот же запрос
+    task = _status_inflight.get(payment_id)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_payment_status(payment_id))
+        _status_inflight[payment_id] = task
+        task.add_done_callback(lambda _: _status_inflight.pop(payment_id, None))
+
+    status = await asyncio.shield(task)
+    if status is not None:
+        _status_cache.set(payment_id, status)
+    return status
+
+
+async def _fetch_payment_status(payment_id: str) -> Optional[str]:
     try:
-        payment = YKPayment.find_one(payment_id)
-        return payment.status
+        response = await _get_client().get(f"/payments/{payment_id}")
+        response.raise_for_status()
+        return response.json()["status"]
     except Exception as e:
-        print(f"YooKassa check error: {e}")
+        logger.error(f"YooKassa check error: {e}")
         return None
\ No newline at end of file
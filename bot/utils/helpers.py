@@ -1,6 +1,10 @@
+import asyncio
 from datetime import datetime
+from functools import lru_cache
 
 
+# Одни и те же цены форматируются многократно (текущая/мин/макс, мониторинг)
+@lru_cache(maxsize=4096)
 def format_price(price: float, currency: str = "₽") -> str:
     """Форматирует цену: 3200 -> 3 200₽"""
     if price is None:
@@ -28,13 +32,36 @@ def format_datetime(dt: datetime) -> str:
     return dt.strftime("%d.%m.%Y %H:%M")
 
 
+_PLAN_BADGES = {
+    "FREE": "🆓 FREE",
+    "PRO": "⭐ PRO",
+    "PREMIUM": "👑 PREMIUM",
+}
+
+
 def plan_badge(plan: str) -> str:
-    badges = {
-        "FREE": "🆓 FREE",
-        "PRO": "⭐ PRO",
-        "PREMIUM": "👑 PREMIUM",
-    }
-    return badges.get(plan.upper(), plan)
+    badge = _PLAN_BADGES.get(plan)
+    if badge is None:
+        badge = _PLAN_BADGES.get(plan.upper(), plan)
+    return badge
+
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: set = set()
+
+
+async def _safe_delete(message) -> None:
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+
+def delete_in_background(message) -> None:
+    """Удаляет сообщение, не дожидаясь ответа Telegram (ошибки игнорируются)"""
+    task = asyncio.create_task(_safe_delete(message))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 def truncate(text: str, max_len: int = 50) -> str:
@@ -0,0 +1,47 @@
+import ssl
+from typing import Optional
+
+import aiohttp
+import certifi
+
+# SSL-контекст с certifi собирается один раз, а не на каждый запрос
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+# Пул соединений: общий лимит и лимит на хост (параллельные запросы к одной
+# площадке в поиске аналогов/дешевле), keep-alive держим дольше дефолтных 15с
+HTTP_POOL_LIMIT = 200
+HTTP_POOL_LIMIT_PER_HOST = 50
+HTTP_KEEPALIVE_TIMEOUT = 75
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+# Одна сессия на весь бот: keep-alive и DNS-кеш переиспользуются между скрапами
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Общая aiohttp-сессия для скрапера и резолва ссылок.
+    Заголовки и таймауты передаются в каждом запросе; куки не сохраняются,
+    чтобы запросы к площадкам не зависели друг от друга.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ssl=SSL_CONTEXT,
+            ),
+            timeout=HTTP_TIMEOUT,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
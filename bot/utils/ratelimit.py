@@ -0,0 +1,56 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiolimiter import AsyncLimiter
+
+T = TypeVar("T")
+
+# Лимиты Telegram: ~30 сообщений/сек на бота и 1 сообщение/сек в один чат
+GLOBAL_RATE = 25
+PER_CHAT_RATE = 1
+PER_CHAT_MAXSIZE = 4096
+
+
+class TgLimiter:
+    """Token bucket под лимиты Telegram: общий на бота + отдельный на каждый чат"""
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        per_chat_maxsize: int = PER_CHAT_MAXSIZE,
+    ):
+        self.global_ = AsyncLimiter(global_rate, 1)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_maxsize = per_chat_maxsize
+        self._per_chat: OrderedDict[int, AsyncLimiter] = OrderedDict()
+
+    def _chat_limiter(self, chat_id: int) -> AsyncLimiter:
+        limiter = self._per_chat.get(chat_id)
+        if limiter is None:
+            limiter = self._per_chat[chat_id] = AsyncLimiter(self.per_chat_rate, 1)
+            while len(self._per_chat) > self.per_chat_maxsize:
+                self._per_chat.popitem(last=False)
+        else:
+            self._per_chat.move_to_end(chat_id)
+        return limiter
+
+    async def send(self, chat_id: int, coro_factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет запрос к Telegram с учётом лимитов.
+        При RetryAfter ждёт указанное время и повторяет.
+        """
+        while True:
+            async with self._chat_limiter(chat_id):
+                async with self.global_:
+                    try:
+                        return await coro_factory()
+                    except TelegramRetryAfter as e:
+                        retry_after = e.retry_after
+            await asyncio.sleep(retry_after)
+
+
+# Общий лимитер для всех рассылок бота
+tg_limiter = TgLimiter()
@@ -1,5 +1,7 @@
 import os
 from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +10,8 @@ load_dotenv()
 @dataclass
 class BotConfig:
     token: str = os.getenv("BOT_TOKEN", "")
+    # Если задан — при старте не запрашиваем get_me
+    username: str = os.getenv("BOT_USERNAME", "")
     admin_ids: list[int] = field(default_factory=lambda: [
         int(x.strip()) for x in os.getenv("ADMIN_IDS", "0").split(",") if x.strip()
     ])
@@ -30,31 +34,49 @@ class GigaChatConfig:
 @dataclass
 class DatabaseConfig:
     url: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///priceghost.db")
+    query_cache_size: int = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+    pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    # Размер page cache SQLite в KiB (PRAGMA cache_size=-N)
+    sqlite_cache_kb: int = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+
+
+@dataclass
+class ChartConfig:
+    # Процессы для рендера графиков (каждый — отдельный matplotlib, ~60-100 МБ)
+    workers: int = max(1, int(os.getenv("CHART_WORKERS", "2")))
 
 
 @dataclass
 class WebhookConfig:
+    # Webhook включается только явно (BOT_MODE=webhook), по умолчанию — polling
+    enabled: bool = False
     url: str = ""
     path: str = "/webhook"
     host: str = "0.0.0.0"
     port: int = 8080
+    secret: str = ""
+    # Сколько параллельных доставок апдейтов разрешить Telegram (1..100)
+    max_connections: int = 100
 
     def __post_init__(self):
         # Railway даёт PORT автоматически — это главный порт
         self.port = int(os.getenv("PORT", os.getenv("WEB_SERVER_PORT", "8080")))
         self.host = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+        self.enabled = os.getenv("BOT_MODE", "polling").strip().lower() == "webhook"
         self.url = os.getenv("WEBHOOK_URL", "").rstrip("/")
         raw_path = os.getenv("WEBHOOK_PATH", "/webhook").strip("/")
         self.path = f"/{raw_path}"
+        self.secret = os.getenv("WEBHOOK_SECRET", "")
+        self.max_connections = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
 
     @property
     def full_url(self) -> str:
         return f"{self.url}{self.path}"
 
 
-@dataclass
-class PlanLimits:
-    FREE = {
+# Лимиты тарифов — неизменяемые, собираются один раз при импорте
+PLAN_LIMITS: dict[str, Mapping[str, Any]] = {
+    "FREE": MappingProxyType({
         "checks_per_day": 3,
         "history_days": 30,
         "monitor_items": 0,
@@ -67,8 +89,8 @@ class PlanLimits:
         "price_predict": False,
         "cashback": False,
         "chart": False,
-    }
-    PRO = {
+    }),
+    "PRO": MappingProxyType({
         "checks_per_day": 30,
         "history_days": 365,
         "monitor_items": 20,
@@ -81,8 +103,8 @@ class PlanLimits:
         "price_predict": False,
         "cashback": False,
         "chart": True,
-    }
-    PREMIUM = {
+    }),
+    "PREMIUM": MappingProxyType({
         "checks_per_day": 999999,
         "history_days": 365,
         "monitor_items": 50,
@@ -95,11 +117,28 @@ class PlanLimits:
         "price_predict": True,
         "cashback": True,
         "chart": True,
-    }
+    }),
+}
+
+
+@dataclass
+class PlanLimits:
+    FREE = PLAN_LIMITS["FREE"]
+    PRO = PLAN_LIMITS["PRO"]
+    PREMIUM = PLAN_LIMITS["PREMIUM"]
+
+    @staticmethod
+    def get(plan: str) -> Mapping[str, Any]:
+        limits = PLAN_LIMITS.get(plan)
+        if limits is None:
+            limits = PLAN_LIMITS.get(plan.upper(), PLAN_LIMITS["FREE"])
+        return limits
 
-    @classmethod
-    def get(cls, plan: str) -> dict:
-        return getattr(cls, plan.upper(), cls.FREE)
+    @staticmethod
+    def for_user(user) -> tuple[str, Mapping[str, Any]]:
+        """Активный тариф пользователя (FREE, если его нет в базе) и его лимиты"""
+        active_plan = user.active_plan if user else "FREE"
+        return active_plan, PlanLimits.get(active_plan)
 
 
 @dataclass
@@ -108,6 +147,7 @@ class Config:
     yookassa: YookassaConfig = field(default_factory=YookassaConfig)
     gigachat: GigaChatConfig = field(default_factory=GigaChatConfig)
     db: DatabaseConfig = field(default_factory=DatabaseConfig)
+    chart: ChartConfig = field(default_factory=ChartConfig)
     webhook: WebhookConfig = field(default_factory=WebhookConfig)
     plans: PlanLimits = field(default_factory=PlanLimits)
 
@@ -1,22 +1,91 @@
+import asyncio
+
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import select, update, delete, func, insert, event, case, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import selectinload, raiseload
 from datetime import datetime, timedelta
 from typing import Optional
 
-from database.models import Base, User, Product, PriceRecord, MonitoredProduct, Payment, PlanType
+from database.models import (
+    Base, User, Product, PriceRecord, MonitoredProduct, Payment, PlanType,
+    AggregateCounter, COUNTER_USERS, COUNTER_PAYMENTS, COUNTER_REVENUE,
+)
 from config import config
+from bot.utils.cache import TTLCache
+
+# Пользователь почти не меняется в рамках сессии — кешируем чтения на минуту
+USER_CACHE_TTL = 60
+# Карточка товара: повторные нажатия кнопок не ходят в базу
+PRODUCT_CACHE_TTL = 60
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Настройки SQLite на каждое новое соединение пула"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{config.db.sqlite_cache_kb}")
+    cursor.close()
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    """In-memory SQLite: SQLAlchemy берёт StaticPool, и pool_size он не принимает"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    )
 
 
 class Database:
     def __init__(self):
-        self.engine = create_async_engine(config.db.url, echo=False)
+        engine_kwargs = {}
+        if not _is_memory_sqlite(config.db.url):
+            # Соединения живут в пуле и переиспользуются между запросами
+            engine_kwargs["pool_size"] = config.db.pool_size
+        self.engine = create_async_engine(
+            config.db.url,
+            echo=False,
+            query_cache_size=config.db.query_cache_size,
+            **engine_kwargs,
+        )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
         self.session_factory = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        self._user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+        self._product_cache = TTLCache(maxsize=2048, ttl=PRODUCT_CACHE_TTL)
 
     async def init(self):
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # create_all не добавляет индексы в уже существующие таблицы
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_users_created_at ON users (created_at)"
+            ))
+            await self._rebuild_counters(conn)
+
+    @staticmethod
+    async def _rebuild_counters(conn):
+        """
+        Пересчитывает aggregate_counters по реальным таблицам при старте.
+        Дальше счётчики поддерживаются событиями ORM (см. database/models.py).
+        """
+        succeeded = Payment.status == "succeeded"
+        row = (await conn.execute(select(
+            select(func.count(User.id)).scalar_subquery(),
+            select(func.count(Payment.id)).where(succeeded).scalar_subquery(),
+            select(func.coalesce(func.sum(Payment.amount), 0)).where(succeeded).scalar_subquery(),
+        ))).one()
+
+        now = datetime.utcnow()
+        await conn.execute(delete(AggregateCounter))
+        await conn.execute(insert(AggregateCounter), [
+            {"name": COUNTER_USERS, "value": row[0], "updated_at": now},
+            {"name": COUNTER_PAYMENTS, "value": row[1], "updated_at": now},
+            {"name": COUNTER_REVENUE, "value": row[2], "updated_at": now},
+        ])
 
     async def close(self):
         await self.engine.dispose()
@@ -48,19 +117,30 @@ class Database:
                 user.updated_at = datetime.utcnow()
                 await session.commit()
 
+            self._user_cache.set(telegram_id, user)
             return user
 
     async def get_user(self, telegram_id: int) -> Optional[User]:
+        user = self._user_cache.get(telegram_id)
+        if user is not None:
+            return user
+
         async with self.session_factory() as session:
             result = await session.execute(
                 select(User).where(User.telegram_id == telegram_id)
             )
-            return result.scalar_one_or_none()
+            user = result.scalar_one_or_none()
+
+        if user is not None:
+            self._user_cache.set(telegram_id, user)
+        return user
 
-    async def check_and_increment_usage(self, telegram_id: int) -> tuple[bool, int, int]:
+    async def ensure_user_and_consume_quota(
+        self, telegram_id: int, username: str = None, first_name: str = None
+    ) -> tuple[User, bool, int, int]:
         """
-        Проверяет лимит и увеличивает счётчик.
-        Returns: (allowed, used, limit)
+        Создаёт/обновляет пользователя и списывает одну проверку — в одной транзакции.
+        Returns: (user, allowed, used, limit)
         """
         from config import PlanLimits
 
@@ -69,25 +149,38 @@ class Database:
                 select(User).where(User.telegram_id == telegram_id)
             )
             user = result.scalar_one_or_none()
+
+            now = datetime.utcnow()
             if not user:
-                return False, 0, 0
+                user = User(
+                    telegram_id=telegram_id,
+                    username=username,
+                    first_name=first_name,
+                    checks_today=0,
+                    checks_reset_date=now,
+                )
+                session.add(user)
+            else:
+                user.username = username
+                user.first_name = first_name
+                user.updated_at = now
 
             # Сброс счётчика если новый день
-            today = datetime.utcnow().date()
-            if user.checks_reset_date is None or user.checks_reset_date.date() < today:
+            if user.checks_reset_date is None or user.checks_reset_date.date() < now.date():
                 user.checks_today = 0
-                user.checks_reset_date = datetime.utcnow()
+                user.checks_reset_date = now
 
-            plan = user.active_plan
-            limits = PlanLimits.get(plan)
+            limits = PlanLimits.get(user.active_plan)
             max_checks = limits["checks_per_day"]
 
-            if user.checks_today >= max_checks:
-                return False, user.checks_today, max_checks
+            allowed = user.checks_today < max_checks
+            if allowed:
+                user.checks_today += 1
 
-            user.checks_today += 1
             await session.commit()
-            return True, user.checks_today, max_checks
+
+        self._user_cache.set(telegram_id, user)
+        return user, allowed, user.checks_today, max_checks
 
     async def activate_plan(self, telegram_id: int, plan: str, days: int = 30):
         async with self.session_factory() as session:
@@ -99,11 +192,14 @@ class Database:
                 user.plan = plan
                 user.plan_expires_at = datetime.utcnow() + timedelta(days=days)
                 await session.commit()
+        self._user_cache.pop(telegram_id)
 
     async def get_total_users(self) -> int:
         async with self.session_factory() as session:
-            result = await session.execute(select(func.count(User.id)))
-            return result.scalar() or 0
+            result = await session.execute(
+                select(AggregateCounter.value).where(AggregateCounter.name == COUNTER_USERS)
+            )
+            return int(result.scalar() or 0)
 
     # ==================== PRODUCTS ====================
 
@@ -147,13 +243,22 @@ class Database:
                 update(Product).where(Product.id == product_id).values(**kwargs)
             )
             await session.commit()
+        self._product_cache.pop(product_id)
 
     async def get_product(self, product_id: int) -> Optional[Product]:
+        product = self._product_cache.get(product_id)
+        if product is not None:
+            return product
+
         async with self.session_factory() as session:
             result = await session.execute(
                 select(Product).where(Product.id == product_id)
             )
-            return result.scalar_one_or_none()
+            product = result.scalar_one_or_none()
+
+        if product is not None:
+            self._product_cache.set(product_id, product)
+        return product
 
     # ==================== PRICE RECORDS ====================
 
@@ -171,6 +276,46 @@ class Database:
             session.add(record)
             await session.commit()
 
+    async def save_price_snapshot(
+        self, product_id: int, fields: dict, price: float,
+        original_price: float = None, discount_percent: float = None,
+        history_days: Optional[int] = None,
+    ) -> Optional[list[PriceRecord]]:
+        """
+        Обновляет товар, пишет цену (если > 0) и, при history_days,
+        сразу читает историю — всё в одной сессии и одной транзакции.
+        """
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Product).where(Product.id == product_id).values(**fields)
+            )
+            if price > 0:
+                session.add(PriceRecord(
+                    product_id=product_id,
+                    price=price,
+                    original_price=original_price,
+                    discount_percent=discount_percent,
+                ))
+                await session.flush()
+
+            records = None
+            if history_days is not None:
+                since = datetime.utcnow() - timedelta(days=history_days)
+                result = await session.execute(
+                    select(PriceRecord)
+                    .where(
+                        PriceRecord.product_id == product_id,
+                        PriceRecord.recorded_at >= since
+                    )
+                    .order_by(PriceRecord.recorded_at.asc())
+                )
+                records = list(result.scalars().all())
+
+            await session.commit()
+
+        self._product_cache.pop(product_id)
+        return records
+
     async def get_price_history(
         self, product_id: int, days: int = 365
     ) -> list[PriceRecord]:
@@ -186,6 +331,44 @@ class Database:
             )
             return list(result.scalars().all())
 
+    async def get_price_stats(
+        self, product_id: int, days: int = 365
+    ) -> tuple[int, Optional[float], Optional[float], Optional[float]]:
+        """
+        Агрегаты истории цен одним запросом, без загрузки записей.
+        Returns (число записей, min, max, avg); min/max/avg — только по ценам > 0.
+        """
+        positive = case((PriceRecord.price > 0, PriceRecord.price))
+        async with self.session_factory() as session:
+            since = datetime.utcnow() - timedelta(days=days)
+            result = await session.execute(
+                select(
+                    func.count(PriceRecord.id),
+                    func.min(positive),
+                    func.max(positive),
+                    func.avg(positive),
+                )
+                .where(
+                    PriceRecord.product_id == product_id,
+                    PriceRecord.recorded_at >= since
+                )
+            )
+            return tuple(result.one())
+
+    async def get_recent_prices(self, product_id: int, days: int = 60) -> list:
+        """Строки (price, recorded_at) за период по возрастанию даты — без ORM-объектов"""
+        async with self.session_factory() as session:
+            since = datetime.utcnow() - timedelta(days=days)
+            result = await session.execute(
+                select(PriceRecord.price, PriceRecord.recorded_at)
+                .where(
+                    PriceRecord.product_id == product_id,
+                    PriceRecord.recorded_at >= since
+                )
+                .order_by(PriceRecord.recorded_at.asc())
+            )
+            return list(result.all())
+
     # ==================== MONITORING ====================
 
     async def add_monitor(
@@ -249,28 +432,25 @@ class Database:
 
     async def get_user_monitors(self, telegram_id: int) -> list[dict]:
         async with self.session_factory() as session:
+            # Мониторы + товары за 2 запроса: без отдельного поиска пользователя и N+1
             result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
-            )
-            user = result.scalar_one_or_none()
-            if not user:
-                return []
-
-            result = await session.execute(
-                select(MonitoredProduct, Product)
-                .join(Product, MonitoredProduct.product_id == Product.id)
+                select(MonitoredProduct)
+                .join(User, MonitoredProduct.user_id == User.id)
                 .where(
-                    MonitoredProduct.user_id == user.id,
+                    User.telegram_id == telegram_id,
                     MonitoredProduct.is_active == True
                 )
+                .options(
+                    selectinload(MonitoredProduct.product),
+                    raiseload("*"),
+                )
             )
-            rows = result.all()
             return [
                 {
                     "monitor": m,
-                    "product": p
+                    "product": m.product
                 }
-                for m, p in rows
+                for m in result.scalars().all()
             ]
 
     async def remove_monitor(self, user_id: int, product_id: int):
@@ -356,6 +536,9 @@ class Database:
                 user.plan_expires_at = datetime.utcnow() + timedelta(days=30)
 
             await session.commit()
+
+            if user:
+                self._user_cache.pop(user.telegram_id)
             return payment
 
     async def get_payment_by_yookassa_id(self, yookassa_id: str) -> Optional[Payment]:
@@ -368,11 +551,23 @@ class Database:
 
 # Singleton
 _db: Optional[Database] = None
+_db_lock = asyncio.Lock()
 
 
 async def get_db() -> Database:
+    # Быстрый путь — без ожидания лока, когда база уже поднята
+    if _db is not None:
+        return _db
+    return await _init_db()
+
+
+async def _init_db() -> Database:
     global _db
-    if _db is None:
-        _db = Database()
-        await _db.init()
+    async with _db_lock:
+        # Публикуем синглтон только после init, чтобы параллельные
+        # первые вызовы не получили неинициализированную базу
+        if _db is None:
+            db = Database()
+            await db.init()
+            _db = db
     return _db
\ No newline at end of file
@@ -1,7 +1,8 @@
 from datetime import datetime
 from sqlalchemy import (
     Column, Integer, BigInteger, String, Float, Boolean,
-    DateTime, Text, ForeignKey, Index, Enum as SAEnum
+    DateTime, Text, ForeignKey, Index, Enum as SAEnum,
+    event, inspect, update,
 )
 from sqlalchemy.orm import DeclarativeBase, relationship
 import enum
@@ -50,6 +51,10 @@ class User(Base):
     monitored_products = relationship("MonitoredProduct", back_populates="user", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+    )
+
     @property
     def is_premium(self) -> bool:
         if self.plan == PlanType.PREMIUM.value and self.plan_expires_at:
@@ -161,4 +166,59 @@ class Payment(Base):
     user = relationship("User", back_populates="payments")
 
     def __repr__(self):
-        return f"<Payment(id={self.id}, user={self.user_id}, plan={self.plan}, status={self.status})>"
\ No newline at end of file
+        return f"<Payment(id={self.id}, user={self.user_id}, plan={self.plan}, status={self.status})>"
+
+
+class AggregateCounter(Base):
+    """Предрасчитанные счётчики для админки (обновляются событиями ORM)"""
+    __tablename__ = "aggregate_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AggregateCounter({self.name}={self.value})>"
+
+
+COUNTER_USERS = "users_total"
+COUNTER_PAYMENTS = "payments_total"
+COUNTER_REVENUE = "revenue_total"
+
+
+def _bump_counters(connection, **deltas):
+    """Атомарно прибавляет значения к счётчикам в той же транзакции, что и flush"""
+    table = AggregateCounter.__table__
+    for name, delta in deltas.items():
+        connection.execute(
+            update(table)
+            .where(table.c.name == name)
+            .values(value=table.c.value + delta, updated_at=datetime.utcnow())
+        )
+
+
+def _count_payment(connection, payment: "Payment"):
+    _bump_counters(connection, **{COUNTER_PAYMENTS: 1, COUNTER_REVENUE: payment.amount or 0})
+
+
+@event.listens_for(User, "after_insert")
+def _on_user_insert(mapper, connection, target):
+    _bump_counters(connection, **{COUNTER_USERS: 1})
+
+
+@event.listens_for(Payment, "after_insert")
+def _on_payment_insert(mapper, connection, target):
+    if target.status == PaymentStatus.SUCCEEDED.value:
+        _count_payment(connection, target)
+
+
+@event.listens_for(Payment, "after_update")
+def _on_payment_update(mapper, connection, target):
+    # Считаем только переход в succeeded — повторный complete_payment не удваивает доход
+    history = inspect(target).attrs.status.history
+    if (
+        target.status == PaymentStatus.SUCCEEDED.value
+        and history.deleted
+        and history.deleted[0] != PaymentStatus.SUCCEEDED.value
+    ):
+        _count_payment(connection, target)
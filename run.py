@@ -10,9 +10,19 @@ logging.basicConfig(
 
 
 def main():
-    logging.info("Starting in POLLING mode")
-    from bot.main import start_polling
-    asyncio.run(start_polling())
+    from config import config
+
+    if config.webhook.enabled and not config.webhook.url:
+        logging.warning("BOT_MODE=webhook, but WEBHOOK_URL is empty — falling back to polling")
+
+    if config.webhook.enabled and config.webhook.url:
+        logging.info("Starting in WEBHOOK mode")
+        from bot.main import start_webhook
+        asyncio.run(start_webhook())
+    else:
+        logging.info("Starting in POLLING mode")
+        from bot.main import start_polling
+        asyncio.run(start_polling())
 
 
 if __name__ == "__main__":